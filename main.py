@@ -1,18 +1,26 @@
 
 from enum import member
 import os
+import asyncio
 import logging
 import discord
 import random
 import re
+import unicodedata
 import time
 import json
+import io
+import heapq
+import sqlite3
 import aiohttp
 from discord import guild
 from discord.ui import View, Button
 import math
-from collections import defaultdict
+from collections import defaultdict, OrderedDict, deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from discord.ext import commands
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 from dotenv import load_dotenv
 import google.generativeai as genai
 # =========================
@@ -21,7 +29,6 @@ import google.generativeai as genai
 load_dotenv()
 
 TOKEN = os.getenv("DISCORD_TOKEN")
-game_counter = 1
 # =========================
 # Logging
 # =========================
@@ -40,40 +47,268 @@ intents.members = True
 intents.voice_states = True
 intents.guilds = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+class Bot(commands.Bot):
+    async def close(self):
+        # Write out anything still waiting in a write-behind buffer
+        await WriteBehind.flush_all()
+        await super().close()
 
-@bot.event
-async def on_member_join(member):
-    WELCOME_CHANNEL_ID = 1461828500662128710
-    intro_channel_id = 1462151264727990394
-    RULES_CHANNEL_ID = 1461809896553971826
-    GENERAL_CHANNEL_ID = 1461802394265321589
-    
-    channel = bot.get_channel(WELCOME_CHANNEL_ID)
-    if not channel:
-        return
+    async def on_command_error(self, ctx, error):
+        if isinstance(error, CooldownActive):
+            return await ctx.send(f"⏳ Wait {format_wait(error.retry_after)} before using this again.")
+        if isinstance(error, NotAllowed):
+            return await ctx.send("❌ You are not allowed to use this command.")
+        await super().on_command_error(ctx, error)
 
-    channel2 = bot.get_channel(GENERAL_CHANNEL_ID)
-    if not channel2:
-        return
 
+bot = Bot(command_prefix="!", intents=intents)
+
+# =========================
+# Persistence
+# =========================
+def write_file_atomic(path, data):
+    # Write to a temp file and rename, so a crash never leaves a half-written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class WriteBehind:
+    # Coalesces changes and flushes them in the background through
+    # write_file_atomic; subclasses provide path and snapshot()
+    FLUSH_DELAY = 1  # seconds
+    MAX_RETRY_DELAY = 60  # seconds between retries while writes keep failing
+    instances = []   # flushed on shutdown by Bot.close
+
+    def __init__(self, path):
+        self.path = path
+        self.write_lock = asyncio.Lock()
+        self.dirty = False
+        self.failures = 0
+        self.flush_task = None
+        WriteBehind.instances.append(self)
+
+    @classmethod
+    async def flush_all(cls):
+        for store in cls.instances:
+            if store.dirty and store.path:
+                await store.flush()
+
+    def read_json(self, default):
+        if not os.path.exists(self.path):
+            return default
+
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            # Keep the broken file around instead of silently wiping it
+            backup = f"{self.path}.corrupt"
+            os.replace(self.path, backup)
+            print(f"❌ {self.path} is corrupt ({e}), moved to {backup}")
+            return default
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def _mark_dirty(self):
+        self.dirty = True
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        while self.dirty:
+            await asyncio.sleep(min(self.FLUSH_DELAY * 2 ** self.failures, self.MAX_RETRY_DELAY))
+            await self.flush()
+
+    async def flush(self):
+        async with self.write_lock:
+            self.dirty = False
+            data = json.dumps(self.snapshot(), indent=4)
+            try:
+                await asyncio.to_thread(write_file_atomic, self.path, data)
+            except OSError as e:
+                # Logged, not raised; still dirty, so _flush_later (or shutdown) retries
+                self.dirty = True
+                self.failures += 1
+                print(f"❌ Error saving {self.path}: {e}")
+            else:
+                self.failures = 0
+
+
+WELCOME_CHANNEL_ID = 1461828500662128710
+INTRO_CHANNEL_ID = 1462151264727990394
+RULES_CHANNEL_ID = 1461809896553971826
+GENERAL_CHANNEL_ID = 1461802394265321589
+SERVER_LOGO_FILE = "hamrokurapfp.png"
+WELCOME_FONT = os.getenv("WELCOME_FONT", "DejaVuSans-Bold.ttf")
+CARD_SIZE = (800, 280)
+CARD_AVATAR = 180
+CARD_CACHE_SIZE = 128
+
+# Join bursts: once THRESHOLD members join within WINDOW seconds, further
+# joins are buffered for WINDOW seconds and welcomed together.
+WELCOME_BURST = {
+    "default": {"THRESHOLD": 3, "WINDOW": 10},
+    # guild id: {"THRESHOLD": ..., "WINDOW": ...}
+}
+WELCOME_BATCH_SIZE = 40  # mentions per combined message
+
+
+class WelcomeCards:
+    """
+    Renders welcome cards (avatar + name over a template built from the
+    server logo). The template, avatar mask and fonts are decoded once;
+    rendering runs on a single worker thread, and recent cards are kept
+    as PNG bytes keyed by member, avatar and name.
+    """
+    def __init__(self, logo_path, max_entries):
+        self.logo_path = logo_path
+        self.max_entries = max_entries
+        self.cards = OrderedDict()  # (guild id, member id, avatar key, name) -> png bytes
+        self.hits = 0
+        self.misses = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cards")
+        self.template = None
+        self.mask = None
+        self.fonts = {}
+        self._logo = None
+
+    @property
+    def logo(self):
+        if self._logo is None:
+            with open(self.logo_path, "rb") as f:
+                self._logo = f.read()
+        return self._logo
+
+    def _font(self, size):
+        if size not in self.fonts:
+            try:
+                self.fonts[size] = ImageFont.truetype(WELCOME_FONT, size)
+            except OSError:
+                self.fonts[size] = ImageFont.load_default(size)
+        return self.fonts[size]
+
+    def _build_template(self):
+        width, height = CARD_SIZE
+        template = Image.new("RGBA", CARD_SIZE, (24, 26, 33, 255))
+
+        # Server logo faded into the right side of the card
+        logo = Image.open(io.BytesIO(self.logo)).convert("RGBA")
+        logo = ImageOps.fit(logo, (height, height))
+        logo.putalpha(90)
+        template.alpha_composite(logo, (width - height, 0))
+
+        draw = ImageDraw.Draw(template)
+        left = (height - CARD_AVATAR) // 2
+        draw.ellipse(
+            (left - 6, left - 6, left + CARD_AVATAR + 6, left + CARD_AVATAR + 6),
+            fill=(255, 69, 0, 255)
+        )
+
+        mask = Image.new("L", (CARD_AVATAR, CARD_AVATAR), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, CARD_AVATAR, CARD_AVATAR), fill=255)
+
+        self.template, self.mask = template, mask
+
+    def _fit_text(self, draw, text, size, max_width):
+        font = self._font(size)
+        if draw.textlength(text, font=font) <= max_width:
+            return text, font
+        while len(text) > 1 and draw.textlength(text + "…", font=font) > max_width:
+            text = text[:-1]
+        return text + "…", font
+
+    def render(self, avatar, name, guild_name):
+        # Runs on the worker thread
+        if self.template is None:
+            self._build_template()
+
+        width, height = CARD_SIZE
+        card = self.template.copy()
+        left = (height - CARD_AVATAR) // 2
+
+        avatar = ImageOps.fit(Image.open(io.BytesIO(avatar)).convert("RGBA"), (CARD_AVATAR, CARD_AVATAR))
+        card.paste(avatar, (left, left), self.mask)
+
+        draw = ImageDraw.Draw(card)
+        text_x = height + 10
+        max_width = width - text_x - 30
+        draw.text((text_x, 60), "WELCOME", font=self._font(28), fill=(255, 69, 0))
+        name, font = self._fit_text(draw, name, 52, max_width)
+        draw.text((text_x, 100), name, font=font, fill=(255, 255, 255))
+        guild_name, font = self._fit_text(draw, f"to {guild_name}", 26, max_width)
+        draw.text((text_x, 175), guild_name, font=font, fill=(185, 187, 190))
+
+        out = io.BytesIO()
+        card.convert("RGB").save(out, "PNG", compress_level=1)  # encode speed over size
+        return out.getvalue()
+
+    async def card(self, member):
+        avatar = member.display_avatar.with_size(256).with_static_format("png")
+        key = (member.guild.id, member.id, avatar.key, member.display_name)
+
+        if key in self.cards:
+            self.hits += 1
+            self.cards.move_to_end(key)
+            return self.cards[key]
+        self.misses += 1
+
+        data = await avatar.read()
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self.executor, self.render, data, member.display_name, member.guild.name)
+
+        self.cards[key] = png
+        while len(self.cards) > self.max_entries:
+            self.cards.popitem(last=False)
+        return png
+
+    def benchmark(self, count=200):
+        # Cards/second for uncached renders (runs on the worker thread)
+        avatar = io.BytesIO()
+        Image.new("RGB", (256, 256), (88, 101, 242)).save(avatar, "PNG")
+        avatar = avatar.getvalue()
+
+        self.render(avatar, "warmup", "Hamro Kura")
+        started = time.perf_counter()
+        for i in range(count):
+            self.render(avatar, f"New Member {i}", "Hamro Kura")
+        return count / (time.perf_counter() - started)
+
+
+welcome_cards = WelcomeCards(SERVER_LOGO_FILE, CARD_CACHE_SIZE)
+
+
+def welcome_files(card=None):
+    # Fresh File objects per send: discord.py consumes the buffer
+    files = [discord.File(io.BytesIO(welcome_cards.logo), filename="logo.png")]
+    if card:
+        files.append(discord.File(io.BytesIO(card), filename="welcome.png"))
+    return files
+
+
+def welcome_embeds(member, card=None):
     # Create the embed
     embed1 = discord.Embed(
         title=f"🎉 Welcome {member.name}!",
         description=(
             f"Welcome to **{member.guild.name} , {member.mention}!**\n\n"
-            f"Take your time to introduce yourself and get familiar with the community: <#{intro_channel_id}>\n"
+            f"Take your time to introduce yourself and get familiar with the community: <#{INTRO_CHANNEL_ID}>\n"
             f"Please check the rules here: <#{RULES_CHANNEL_ID}>\n"
-            f"Say hi in {bot.get_channel(GENERAL_CHANNEL_ID).mention}!"
+            f"Say hi in <#{GENERAL_CHANNEL_ID}>!"
         ),
         color=discord.Color.random()
     )
 
-    # Set GIF in the embed
-    embed1.set_image(url="https://static.klipy.com/ii/71b2873e478b9d8d0482ea3ec777ba7f/dc/a3/G01Q5M7K.gif")
+    # Rendered welcome card (sent as an attachment)
+    if card:
+        embed1.set_image(url="attachment://welcome.png")
 
     # Set server logo as thumbnail (small, bottom-right style)
-    embed1.set_thumbnail(url="https://media.discordapp.net/attachments/1462141976618078352/1475968615592235119/hamrokurapfp.png?ex=699f6a64&is=699e18e4&hm=9cb78a311b2a9dddee75412f9c17370519dda44170eab4e08ff67ac617db221a&=&format=webp&quality=lossless&width=352&height=352")
+    embed1.set_thumbnail(url="attachment://logo.png")
 
     # Footer with member count
     embed1.set_footer(text=f"You're member #{len(member.guild.members)}!")
@@ -82,20 +317,152 @@ async def on_member_join(member):
         title=f"🎉 Welcome {member.name}!",
         description=(
             f"Welcome to **{member.guild.name} , {member.mention}!**\n\n"
-            f"Take your time to introduce yourself and get familiar with the community: <#{intro_channel_id}>\n"
+            f"Take your time to introduce yourself and get familiar with the community: <#{INTRO_CHANNEL_ID}>\n"
             f"Everyone please welcome {member.mention}!"
         ),
         color=discord.Color.random()
     )
 
     # Set server logo as thumbnail (small, bottom-right style)
-    embed2.set_thumbnail(url="https://media.discordapp.net/attachments/1462141976618078352/1475968615592235119/hamrokurapfp.png?ex=699f6a64&is=699e18e4&hm=9cb78a311b2a9dddee75412f9c17370519dda44170eab4e08ff67ac617db221a&=&format=webp&quality=lossless&width=352&height=352")
+    embed2.set_thumbnail(url="attachment://logo.png")
 
     # Footer with member count
     embed2.set_footer(text=f"You're member #{len(member.guild.members)}!")
 
-    await channel.send(f"{member.mention}", embed=embed1)
-    await channel2.send(f"{member.mention}", embed=embed2)
+    return embed1, embed2
+
+
+def group_welcome_embeds(guild, members):
+    mentions = ", ".join(m.mention for m in members)
+
+    embed1 = discord.Embed(
+        title=f"🎉 Welcome {len(members)} new members!",
+        description=(
+            f"Welcome to **{guild.name}**, {mentions}!\n\n"
+            f"Take your time to introduce yourselves and get familiar with the community: <#{INTRO_CHANNEL_ID}>\n"
+            f"Please check the rules here: <#{RULES_CHANNEL_ID}>\n"
+            f"Say hi in <#{GENERAL_CHANNEL_ID}>!"
+        ),
+        color=discord.Color.random()
+    )
+    embed1.set_thumbnail(url="attachment://logo.png")
+    embed1.set_footer(text=f"We're now {len(guild.members)} members!")
+
+    embed2 = discord.Embed(
+        title=f"🎉 Welcome {len(members)} new members!",
+        description=(
+            f"Welcome to **{guild.name}**!\n\n"
+            f"Take your time to introduce yourselves: <#{INTRO_CHANNEL_ID}>\n"
+            f"Everyone please welcome {mentions}!"
+        ),
+        color=discord.Color.random()
+    )
+    embed2.set_thumbnail(url="attachment://logo.png")
+    embed2.set_footer(text=f"We're now {len(guild.members)} members!")
+
+    return embed1, embed2
+
+
+class JoinBurst:
+    """
+    Welcomes joiners one by one while traffic is low. When a guild hits its
+    burst threshold, joins are buffered and flushed as one combined welcome
+    per channel at the end of the window.
+    """
+    def __init__(self, config, clock=time.monotonic):
+        self.config = config
+        self.clock = clock
+        self.recent = defaultdict(deque)  # guild id -> join times in the window
+        self.buffers = {}                 # guild id -> members waiting for a flush
+        self.sends = 0
+        self.sends_saved = 0
+
+    def settings(self, guild_id):
+        return self.config.get(guild_id, self.config["default"])
+
+    async def join(self, member):
+        guild_id = member.guild.id
+        settings = self.settings(guild_id)
+        now = self.clock()
+
+        recent = self.recent[guild_id]
+        recent.append(now)
+        while recent and now - recent[0] > settings["WINDOW"]:
+            recent.popleft()
+
+        if guild_id in self.buffers:
+            self.buffers[guild_id].append(member)
+        elif len(recent) >= settings["THRESHOLD"]:
+            self.buffers[guild_id] = [member]
+            asyncio.create_task(self._flush_later(member.guild, settings["WINDOW"]))
+        else:
+            await self._send(member.guild, [member])
+
+    async def _flush_later(self, guild, delay):
+        await asyncio.sleep(delay)
+        members = self.buffers.pop(guild.id, [])
+        members = [m for m in members if guild.get_member(m.id)]  # skip anyone who already left
+        for i in range(0, len(members), WELCOME_BATCH_SIZE):
+            await self._send(guild, members[i:i + WELCOME_BATCH_SIZE])
+
+    async def _send(self, guild, members):
+        channel = bot.get_channel(WELCOME_CHANNEL_ID)
+        if not channel:
+            return
+
+        channel2 = bot.get_channel(GENERAL_CHANNEL_ID)
+        if not channel2:
+            return
+
+        card = None
+        if len(members) == 1:
+            try:
+                card = await welcome_cards.card(members[0])
+            except (discord.HTTPException, OSError) as e:
+                print(f"❌ Welcome card failed for {members[0].id}: {e}")
+            embed1, embed2 = welcome_embeds(members[0], card)
+        else:
+            embed1, embed2 = group_welcome_embeds(guild, members)
+        mentions = " ".join(m.mention for m in members)
+
+        try:
+            await channel.send(mentions, embed=embed1, files=welcome_files(card))
+            await channel2.send(mentions, embed=embed2, files=welcome_files())
+        except discord.HTTPException as e:
+            print(f"❌ Welcome failed: {e}")
+            return
+
+        self.sends += 2
+        self.sends_saved += 2 * (len(members) - 1)
+
+
+join_burst = JoinBurst(WELCOME_BURST)
+
+
+@bot.event
+async def on_member_join(member):
+    await join_burst.join(member)
+
+
+@bot.command(name="welcome-bench")
+async def welcome_bench(ctx):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+    loop = asyncio.get_running_loop()
+    rate = await loop.run_in_executor(welcome_cards.executor, welcome_cards.benchmark)
+    await ctx.send(f"🖼️ Welcome cards: {rate:,.0f} cards/s (uncached render)")
+
+
+@bot.command(name="welcome-stats")
+async def welcome_stats(ctx):
+    settings = join_burst.settings(ctx.guild.id)
+    await ctx.send(
+        f"👋 **Welcomes**\n"
+        f"Burst mode: {settings['THRESHOLD']} joins / {settings['WINDOW']}s\n"
+        f"Sends: {join_burst.sends} | Sends saved: {join_burst.sends_saved}\n"
+        f"Cards cached: {len(welcome_cards.cards)} | Hits: {welcome_cards.hits} | Renders: {welcome_cards.misses}\n"
+        f"Buffered now: {len(join_burst.buffers.get(ctx.guild.id, []))}"
+    )
 # =========================
 # Config
 # =========================
@@ -104,13 +471,274 @@ CONFIG = {
     "TRIO_CHANNEL_ID": 1476919334600314962,  # <-- PUT YOUR TRIO CHANNEL ID HERE
     "SQUAD_CHANNEL_ID": 1462541289173028864,
     "TEAM_CHANNEL_ID": 1461889233399582813,
-    "CATEGORY_ID": None
+    "CATEGORY_ID": None,
+    # Pre-created hidden channels kept ready per hub (0 = create on join)
+    "POOL_SIZES": {"DUO": 0, "TRIO": 0, "Game": 0, "TEAM": 0},
+    "POOL_REFILL_INTERVAL": 5,  # seconds between pool channel creations
+    "DELETE_GRACE": 15          # seconds an empty temp VC survives (0 = delete at once)
 }
 
 
+VC_REGISTRY_FILE = "voice_channels.json"
+GAME_NAME_PATTERN = re.compile(r"^(DUO|TRIO|Game|TEAM) #(\d+)$")
+
 active_channels = set()
 channel_owners = {}
 
+
+class RestScheduler:
+    """
+    Runs voice channel REST calls by priority class (moves first, deletes
+    last) with a cap on calls in flight per route bucket. A 429 parks the
+    route for its retry-after so other routes keep flowing.
+    """
+    PRIORITIES = ("move", "create", "permissions", "embed", "delete")
+
+    def __init__(self, concurrency=4, per_route=2, clock=time.monotonic):
+        self.concurrency = concurrency
+        self.per_route = per_route
+        self.clock = clock
+        self.queues = {kind: deque() for kind in self.PRIORITIES}
+        self.route_busy = defaultdict(int)
+        self.route_blocked = {}  # route -> clock time it may be used again
+        self.running = 0
+        self.completed = defaultdict(int)
+        self.rate_limited = 0
+        self.waits = {kind: deque(maxlen=200) for kind in self.PRIORITIES}
+
+    async def submit(self, kind, route, call):
+        """Queue `call` (a zero-arg coroutine function) and return its result."""
+        future = asyncio.get_running_loop().create_future()
+        self.queues[kind].append((route, call, future, self.clock()))
+        self._pump()
+        return await future
+
+    def depth(self):
+        return {kind: len(queue) for kind, queue in self.queues.items()}
+
+    def _pump(self):
+        while self.running < self.concurrency:
+            picked = self._next()
+            if picked is None:
+                break
+            # Claim the slot now, before the task starts, so the loop sees it
+            self.running += 1
+            self.route_busy[picked[1]] += 1
+            asyncio.create_task(self._run(*picked))
+
+    def _next(self):
+        now = self.clock()
+        wake = None
+
+        for kind in self.PRIORITIES:
+            queue = self.queues[kind]
+            for i, (route, call, future, queued) in enumerate(queue):
+                if future.done():
+                    continue  # caller gave up
+                blocked = self.route_blocked.get(route, 0)
+                if blocked > now:
+                    wake = min(wake or blocked, blocked)
+                    continue
+                if self.route_busy[route] < self.per_route:
+                    del queue[i]
+                    return kind, route, call, future, queued
+
+            # Drop abandoned jobs left at the front
+            while queue and queue[0][2].done():
+                queue.popleft()
+
+        if wake is not None:
+            asyncio.get_running_loop().call_later(wake - now, self._pump)
+        return None
+
+    async def _run(self, kind, route, call, future, queued):
+        self.waits[kind].append(self.clock() - queued)
+
+        try:
+            result = await call()
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                self.rate_limited += 1
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                self.route_blocked[route] = self.clock() + retry_after
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self.running -= 1
+            self.route_busy[route] -= 1
+            self.completed[kind] += 1
+            self._pump()
+
+
+rest = RestScheduler()
+
+
+class NumberAllocator:
+    # Hands out the lowest free number: a min-heap of released numbers
+    # plus a high-water mark, O(log n) per allocate/release. Both are
+    # synchronous, so concurrent handle_join coroutines can't interleave.
+    def __init__(self):
+        self.free = []
+        self.free_set = set()
+        self.high = 0
+
+    def allocate(self):
+        if self.free:
+            n = heapq.heappop(self.free)
+            self.free_set.discard(n)
+            return n
+        self.high += 1
+        return self.high
+
+    def release(self, n):
+        if 0 < n <= self.high and n not in self.free_set:
+            heapq.heappush(self.free, n)
+            self.free_set.add(n)
+
+    def rebuild(self, used):
+        used = set(used)
+        self.high = max(used, default=0)
+        self.free = [n for n in range(1, self.high + 1) if n not in used]
+        self.free_set = set(self.free)
+        heapq.heapify(self.free)
+
+
+vc_numbers = defaultdict(NumberAllocator)  # (guild id, hub prefix) -> allocator
+
+
+class VCRegistry(WriteBehind):
+    # Managed temp VCs (owner, hub, number, created_at) persisted to disk,
+    # so a restart can re-adopt them. active_channels / channel_owners are
+    # the in-memory indexes kept in sync with it.
+    def __init__(self, path):
+        super().__init__(path)
+        self.records = {int(cid): record for cid, record in self.read_json({}).items()}
+
+    def snapshot(self):
+        return self.records
+
+    def add(self, channel, owner_id, hub, number, pooled=False):
+        self.records[channel.id] = {
+            "guild": channel.guild.id,
+            "owner": owner_id,
+            "hub": hub,
+            "number": number,
+            "created_at": time.time(),
+            "pooled": pooled
+        }
+        if not pooled:
+            active_channels.add(channel.id)
+            channel_owners[channel.id] = owner_id
+        self._mark_dirty()
+
+    def adopt(self, channel_id, owner_id):
+        # A pooled channel handed out to its first owner
+        self.records[channel_id]["pooled"] = False
+        active_channels.add(channel_id)
+        self.set_owner(channel_id, owner_id)
+
+    def set_owner(self, channel_id, owner_id):
+        channel_owners[channel_id] = owner_id
+        if channel_id in self.records:
+            self.records[channel_id]["owner"] = owner_id
+            self._mark_dirty()
+
+    def remove(self, channel_id):
+        active_channels.discard(channel_id)
+        channel_owners.pop(channel_id, None)
+        vc_edits.discard(channel_id)
+        record = self.records.pop(channel_id, None)
+        if record is not None:
+            vc_numbers[(record["guild"], record["hub"])].release(record["number"])
+            self._mark_dirty()
+
+
+vc_registry = VCRegistry(VC_REGISTRY_FILE)
+
+
+async def reconcile_voice_channels(guild):
+    """
+    Re-adopt managed VCs that survived a restart and delete empty leftovers.
+    One sweep over the cached hub categories, no per-channel fetches.
+    """
+    hub_ids = {CONFIG[k] for k in ("DUO_CHANNEL_ID", "TRIO_CHANNEL_ID", "SQUAD_CHANNEL_ID", "TEAM_CHANNEL_ID")}
+    categories = {guild.get_channel(CONFIG["CATEGORY_ID"])} if CONFIG["CATEGORY_ID"] else set()
+    categories |= {guild.get_channel(hub).category for hub in hub_ids if guild.get_channel(hub)}
+
+    live = {}
+    for category in categories:
+        if category:
+            for vc in category.voice_channels:
+                if vc.id not in hub_ids:
+                    live[vc.id] = vc
+
+    # Records whose channel is gone (deleted while we were offline)
+    for cid, record in list(vc_registry.records.items()):
+        if record["guild"] == guild.id and cid not in live:
+            vc_registry.remove(cid)
+
+    empty = []
+    adopted = 0
+    for vc in live.values():
+        record = vc_registry.records.get(vc.id)
+        match = GAME_NAME_PATTERN.match(vc.name)
+
+        if record is None and not match:
+            continue  # not one of ours
+
+        if record and record.get("pooled") and not vc.members:
+            pool = vc_pool[(guild.id, record["hub"])]
+            if vc.id not in pool:
+                pool.append(vc.id)
+            continue
+
+        if not vc.members:
+            empty.append(vc)
+            continue
+
+        adopted += 1
+        if record:
+            record["pooled"] = False
+            active_channels.add(vc.id)
+            channel_owners[vc.id] = record["owner"]
+        else:
+            # Created before the registry existed; owner unknown, !vc-claim works
+            vc_registry.add(vc, None, match.group(1), int(match.group(2)))
+
+    # Rebuild number allocators before the first await, so joins during the
+    # deletes below can't reuse a live number. Unregistered empties keep
+    # theirs until they are actually gone.
+    used = defaultdict(list)
+    for record in vc_registry.records.values():
+        if record["guild"] == guild.id:
+            used[record["hub"]].append(record["number"])
+    for vc in empty:
+        if vc.id not in vc_registry.records:
+            match = GAME_NAME_PATTERN.match(vc.name)
+            used[match.group(1)].append(int(match.group(2)))
+    for hub in ("DUO", "TRIO", "Game", "TEAM"):
+        vc_numbers[(guild.id, hub)].rebuild(used[hub])
+
+    async def delete(vc):
+        await rest.submit("delete", f"channel:{vc.id}", vc.delete)
+        if vc.id in vc_registry.records:
+            vc_registry.remove(vc.id)  # frees its number
+        else:
+            match = GAME_NAME_PATTERN.match(vc.name)
+            vc_numbers[(guild.id, match.group(1))].release(int(match.group(2)))
+        return "deleted"
+
+    counts = await run_bulk(empty, delete)
+
+    print(f"✅ VC reconcile ({guild.name}): {adopted} adopted, {counts['deleted']} empty deleted")
+
+    for hub in hub_ids:
+        hub_channel = guild.get_channel(hub)
+        if hub_channel:
+            refill_pool(guild, hub_channel)
+
 # =========================
 # Events
 # =========================
@@ -118,6 +746,14 @@ channel_owners = {}
 async def on_ready():
     print(f"✅ Logged in as {bot.user} ({bot.user.id})")
 
+    # One-shot migration of the legacy participants.json into SQLite
+    if isinstance(storage, SQLiteStorage) and os.path.exists(DATA_FILE) and len(bot.guilds) == 1:
+        count = await storage.import_json(DATA_FILE, bot.guilds[0].id)
+        print(f"✅ Migrated {count} participants from {DATA_FILE}")
+
+    for guild in bot.guilds:
+        await reconcile_voice_channels(guild)
+
 @bot.event
 async def on_voice_state_update(member, before, after):
     if after.channel and (not before.channel or before.channel.id != after.channel.id):
@@ -127,58 +763,41 @@ async def on_voice_state_update(member, before, after):
         await handle_leave(member, before.channel)
     user_id = str(member.id)
 
-async def handle_join(member, channel):
-    limit = 0
-    prefix = ""
-
-    if channel.id == CONFIG["DUO_CHANNEL_ID"]:
-        limit, prefix = 2, "DUO"
-
-    elif channel.id == CONFIG["TRIO_CHANNEL_ID"]:
-        limit, prefix = 3, "TRIO"
-
-    elif channel.id == CONFIG["SQUAD_CHANNEL_ID"]:
-        limit, prefix = 4, "Game"   
-
-    elif channel.id == CONFIG["TEAM_CHANNEL_ID"]:
-        limit, prefix = 10, "TEAM"
-
-    else:
-        return
-
-    guild = member.guild
-    category = guild.get_channel(CONFIG["CATEGORY_ID"]) if CONFIG["CATEGORY_ID"] else channel.category
+def hub_for(channel_id):
+    # Hub channel -> (user limit, prefix), or None for any other channel
+    if channel_id == CONFIG["DUO_CHANNEL_ID"]:
+        return 2, "DUO"
+    elif channel_id == CONFIG["TRIO_CHANNEL_ID"]:
+        return 3, "TRIO"
+    elif channel_id == CONFIG["SQUAD_CHANNEL_ID"]:
+        return 4, "Game"
+    elif channel_id == CONFIG["TEAM_CHANNEL_ID"]:
+        return 10, "TEAM"
+    return None
+
+
+def build_overwrites(guild, member):
+    # member=None builds the hidden overwrites for a pooled channel
     allowed_role = guild.get_role(1492471388764639373)
+    hidden = member is None
 
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(
-            connect=False,
-            speak=True,
-            use_soundboard=True,
-            use_embedded_activities=True,
-            use_voice_activation=True,
-            stream=True,
-            use_external_apps=True
-        ),
-        allowed_role: discord.PermissionOverwrite(
-            connect=True,
-            speak=True,
-            use_soundboard=True,
-            use_embedded_activities=True,
-            use_voice_activation=True,
-            stream=True,
-            use_external_apps=True
-        ),
-        member: discord.PermissionOverwrite(
-            connect=True,
+    def perms(connect):
+        return discord.PermissionOverwrite(
+            connect=connect,
             speak=True,
             use_soundboard=True,
             use_embedded_activities=True,
             use_voice_activation=True,
             stream=True,
-            use_external_apps=True
-        ),
+            use_external_apps=True,
+            view_channel=False if hidden else None
+        )
+
+    overwrites = {
+        guild.default_role: perms(False),
+        allowed_role: perms(not hidden),
         guild.me: discord.PermissionOverwrite(
+            view_channel=True,
             connect=True,
             speak=True,
             use_soundboard=True,
@@ -187,26 +806,183 @@ async def handle_join(member, channel):
             stream=True,
             use_external_apps=True
         )
-        }
-    
-     # Replace with your allowed role ID
+    }
+    if member:
+        overwrites[member] = perms(True)
+    return overwrites
+
+
+vc_pool = defaultdict(deque)  # (guild id, hub prefix) -> hidden channel ids
+vc_pool_refills = {}          # (guild id, hub prefix) -> refill task
+vc_join_latency = {"pooled": deque(maxlen=200), "cold": deque(maxlen=200)}
+
+
+def take_pooled(guild, prefix):
+    pool = vc_pool[(guild.id, prefix)]
+    while pool:
+        channel = guild.get_channel(pool.popleft())
+        if channel:
+            return channel
+    return None
+
+
+def refill_pool(guild, hub_channel):
+    hub = hub_for(hub_channel.id)
+    if not hub or not CONFIG["POOL_SIZES"].get(hub[1]):
+        return
+
+    key = (guild.id, hub[1])
+    task = vc_pool_refills.get(key)
+    if task is None or task.done():
+        vc_pool_refills[key] = asyncio.create_task(_refill_pool(guild, hub_channel, *hub))
+
+
+async def _refill_pool(guild, hub_channel, limit, prefix):
+    # One creation at a time, paced, so a refill never competes with join bursts
+    pool = vc_pool[(guild.id, prefix)]
+    category = guild.get_channel(CONFIG["CATEGORY_ID"]) if CONFIG["CATEGORY_ID"] else hub_channel.category
+
+    numbers = vc_numbers[(guild.id, prefix)]
+
+    while len(pool) < CONFIG["POOL_SIZES"][prefix]:
+        number = numbers.allocate()
+        try:
+            channel = await rest.submit("create", f"guild_channels:{guild.id}", lambda: guild.create_voice_channel(
+                name=f"{prefix} #{number}",
+                category=category,
+                user_limit=limit,
+                overwrites=build_overwrites(guild, None),
+                bitrate=96000
+            ))
+        except discord.HTTPException as e:
+            numbers.release(number)
+            print(f"❌ Error filling VC pool: {e}")
+            return
+
+        vc_registry.add(channel, None, prefix, number, pooled=True)
+        pool.append(channel.id)
+        await asyncio.sleep(CONFIG["POOL_REFILL_INTERVAL"])
+
+
+class DeletionTimers:
+    # Pending deletions in a min-heap of deadlines, driven by one background
+    # task. Cancelling just forgets the deadline; stale heap entries are
+    # skipped when they surface.
+    def __init__(self, grace, on_expire, clock=time.monotonic):
+        self.grace = grace
+        self.on_expire = on_expire
+        self.clock = clock
+        self.heap = []      # (deadline, channel id)
+        self.pending = {}   # channel id -> deadline
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def schedule(self, channel_id):
+        deadline = self.clock() + self.grace
+        self.pending[channel_id] = deadline
+        heapq.heappush(self.heap, (deadline, channel_id))
+        self.wakeup.set()
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def cancel(self, channel_id):
+        self.pending.pop(channel_id, None)
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            deadline, channel_id = self.heap[0]
+            delay = deadline - self.clock()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.heap)
+            if self.pending.get(channel_id) != deadline:
+                continue  # cancelled or rescheduled
+
+            del self.pending[channel_id]
+            try:
+                await self.on_expire(channel_id)
+            except Exception as e:
+                print(f"❌ Error deleting VC: {e}")
+
 
+async def delete_if_empty(channel_id):
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        vc_registry.remove(channel_id)
+    elif channel_id in active_channels and len(channel.members) == 0:
+        await rest.submit("delete", f"channel:{channel_id}", channel.delete)
+        vc_registry.remove(channel_id)  # frees its number for reuse
+
+
+vc_deletions = DeletionTimers(CONFIG["DELETE_GRACE"], delete_if_empty)
+
+
+async def handle_join(member, channel):
+    # Someone came back before the grace period ran out
+    vc_deletions.cancel(channel.id)
+
+    hub = hub_for(channel.id)
+    if not hub:
+        return
+
+    limit, prefix = hub
+    started = time.monotonic()
+    guild = member.guild
+    category = guild.get_channel(CONFIG["CATEGORY_ID"]) if CONFIG["CATEGORY_ID"] else channel.category
+    overwrites = build_overwrites(guild, member)
 
     try:
-        # Create the voice channel
-        global game_counter
-
-        new_channel = await guild.create_voice_channel(
-            name=f"Game #{game_counter}",
-            category=category,
-            user_limit=limit,
-            overwrites=overwrites,
-            bitrate=96000
-        )
-        game_counter += 1
-        await member.move_to(new_channel)
-        active_channels.add(new_channel.id)
-        channel_owners[new_channel.id] = member.id
+        # Create the voice channel, or hand out a pre-warmed one
+        new_channel = take_pooled(guild, prefix)
+        path = "pooled"
+
+        if new_channel:
+            pooled = new_channel
+            try:
+                await rest.submit("permissions", f"channel:{pooled.id}", lambda: pooled.edit(overwrites=overwrites))
+            except discord.HTTPException as e:
+                # Still hidden and unused: put it back (or forget it if it is gone) and create one instead
+                print(f"❌ Could not hand out pooled channel {pooled.id}: {e}")
+                if isinstance(e, discord.NotFound):
+                    vc_registry.remove(pooled.id)
+                else:
+                    vc_pool[(guild.id, prefix)].appendleft(pooled.id)
+                new_channel = None
+            else:
+                vc_registry.adopt(new_channel.id, member.id)
+
+        if not new_channel:
+            path = "cold"
+            numbers = vc_numbers[(guild.id, prefix)]
+            number = numbers.allocate()  # taken before the await, so joins can't collide
+            try:
+                new_channel = await rest.submit("create", f"guild_channels:{guild.id}", lambda: guild.create_voice_channel(
+                    name=f"{prefix} #{number}",
+                    category=category,
+                    user_limit=limit,
+                    overwrites=overwrites,
+                    bitrate=96000
+                ))
+            except Exception:
+                numbers.release(number)
+                raise
+            vc_registry.add(new_channel, member.id, prefix, number)
+
+        await rest.submit("move", f"members:{guild.id}", lambda: member.move_to(new_channel))
+        vc_join_latency[path].append(time.monotonic() - started)
+        refill_pool(guild, channel)
         
         embed = discord.Embed(
             title="🔊 Temporary Voice Channel Created", 
@@ -226,22 +1002,18 @@ async def handle_join(member, channel):
         ), inline=False)
         embed.set_footer(text="Commands only work in this channel's chat.")
         
-        await new_channel.send(embed=embed)
+        await rest.submit("embed", f"messages:{new_channel.id}", lambda: new_channel.send(embed=embed))
 
     except Exception as e:
         print(f"❌ Error creating VC: {e}")
 
 async def handle_leave(member, channel):
-    global game_counter  # 🔥 THIS IS THE FIX
-
     if channel.id in active_channels and len(channel.members) == 0:
         try:
-            await channel.delete()
-            active_channels.discard(channel.id)
-            channel_owners.pop(channel.id, None)
-
-            # Decrease counter safely
-            game_counter = max(1, game_counter - 1)
+            if CONFIG["DELETE_GRACE"] > 0:
+                vc_deletions.schedule(channel.id)
+            else:
+                await delete_if_empty(channel.id)
 
         except Exception as e:
             print(f"❌ Error deleting VC: {e}")
@@ -274,6 +1046,119 @@ def is_vc_owner():
     return commands.check(predicate)
 
 
+class _PendingEdits:
+    __slots__ = ("fields", "perms", "wakeup", "task")
+
+    def __init__(self):
+        self.fields = {}   # channel.edit kwargs, latest value wins
+        self.perms = {}    # target -> overwrite (None = remove), latest wins
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+
+class ChannelEditQueue:
+    # Deferred, coalesced channel edits: commands record the desired state
+    # and return at once; one worker per channel applies it. Discord allows
+    # only 2 renames per 10 minutes per channel, so the name waits for its
+    # window while limit and permission edits go out right away.
+    RENAME_LIMIT = 2
+    RENAME_WINDOW = 600  # seconds
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.pending = {}                     # channel id -> _PendingEdits
+        self.renames = defaultdict(deque)     # channel id -> recent rename times
+
+    def edit(self, channel, **fields):
+        """Queue channel.edit fields; returns seconds until a queued rename can apply."""
+        state = self._state(channel)
+        state.fields.update(fields)
+        self._kick(channel, state)
+        return self.rename_wait(channel.id) if "name" in fields else 0
+
+    def set_permissions(self, channel, target, overwrite):
+        state = self._state(channel)
+        state.perms[target] = overwrite
+        self._kick(channel, state)
+
+    def desired_name(self, channel):
+        state = self.pending.get(channel.id)
+        return state.fields.get("name", channel.name) if state else channel.name
+
+    def rename_wait(self, channel_id):
+        recent = self.renames[channel_id]
+        now = self.clock()
+        while recent and now - recent[0] >= self.RENAME_WINDOW:
+            recent.popleft()
+        if len(recent) < self.RENAME_LIMIT:
+            return 0
+        return self.RENAME_WINDOW - (now - recent[0])
+
+    def discard(self, channel_id):
+        state = self.pending.pop(channel_id, None)
+        if state and state.task:
+            state.task.cancel()
+        self.renames.pop(channel_id, None)
+
+    def _state(self, channel):
+        if channel.id not in self.pending:
+            self.pending[channel.id] = _PendingEdits()
+        return self.pending[channel.id]
+
+    def _kick(self, channel, state):
+        state.wakeup.set()
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._work(channel, state))
+
+    async def _work(self, channel, state):
+        try:
+            while state.fields or state.perms:
+                state.wakeup.clear()
+
+                perms, state.perms = state.perms, {}
+                route = f"channel:{channel.id}"
+                for target, overwrite in perms.items():
+                    await rest.submit("permissions", route, lambda: channel.set_permissions(target, overwrite=overwrite))
+
+                fields = {k: v for k, v in state.fields.items() if k != "name"}
+                for k in fields:
+                    del state.fields[k]
+                if fields:
+                    await rest.submit("permissions", route, lambda: channel.edit(**fields))
+
+                if "name" in state.fields:
+                    wait = self.rename_wait(channel.id)
+                    if wait > 0:
+                        # Sleep until the rename window opens, or until new edits arrive
+                        try:
+                            await asyncio.wait_for(state.wakeup.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                    name = state.fields.pop("name")
+                    if name != channel.name:
+                        await rest.submit("permissions", route, lambda: channel.edit(name=name))
+                        self.renames[channel.id].append(self.clock())
+
+        except discord.NotFound:
+            pass  # channel deleted meanwhile
+        except discord.HTTPException as e:
+            print(f"❌ Error editing VC {channel.id}: {e}")
+        finally:
+            if self.pending.get(channel.id) is state and not (state.fields or state.perms):
+                del self.pending[channel.id]
+
+
+vc_edits = ChannelEditQueue()
+
+
+def rename_note(wait):
+    if wait <= 0:
+        return ""
+    return f" (rename shows in ~{math.ceil(wait / 60)} min, Discord limits channel renames)"
+
+
 # =========================
 # Commands
 # =========================
@@ -281,7 +1166,7 @@ def is_vc_owner():
 @is_vc_owner()
 async def vc_limit(ctx, n: int):
     vc = get_user_vc(ctx)
-    await vc.edit(user_limit=n)
+    vc_edits.edit(vc, user_limit=n)
     await ctx.send(f"✅ User limit set to **{n}**")
 
 
@@ -295,15 +1180,16 @@ async def vc_transfer(ctx, member: discord.Member):
         return
 
     # Update owner
-    channel_owners[vc.id] = member.id
+    vc_registry.set_owner(vc.id, member.id)
 
-    # Keep the prefix (DUO / TRIO / etc)
-    prefix = vc.name.split(" - ")[-1] if " - " in vc.name else "VC"
+    # Keep the prefix (DUO / TRIO / etc), including a rename still queued
+    name = vc_edits.desired_name(vc)
+    prefix = name.split(" - ")[-1] if " - " in name else "VC"
 
-    # Rename channel to new owner
-    await vc.edit(name=f"{member.name} - {prefix}")
+    # Rename channel to new owner (queued; may lag behind the ownership change)
+    wait = vc_edits.edit(vc, name=f"{member.name} - {prefix}")
 
-    await ctx.send(f"👑 Ownership transferred to {member.mention}")
+    await ctx.send(f"👑 Ownership transferred to {member.mention}" + rename_note(wait))
 
 @bot.command(name="vc-claim")
 async def vc_claim(ctx):
@@ -320,14 +1206,15 @@ async def vc_claim(ctx):
         return
 
     # Update owner
-    channel_owners[vc.id] = ctx.author.id
+    vc_registry.set_owner(vc.id, ctx.author.id)
 
     # Keep prefix
-    prefix = vc.name.split(" - ")[-1] if " - " in vc.name else "VC"
+    name = vc_edits.desired_name(vc)
+    prefix = name.split(" - ")[-1] if " - " in name else "VC"
 
-    # Rename channel
-    await vc.edit(name=f"{ctx.author.name} - {prefix}")
-    await ctx.send("👑 You have claimed ownership.")
+    # Rename channel (queued)
+    wait = vc_edits.edit(vc, name=f"{ctx.author.name} - {prefix}")
+    await ctx.send("👑 You have claimed ownership." + rename_note(wait))
 
 @bot.command(name="vc-owner")
 async def vc_owner(ctx):
@@ -342,6 +1229,35 @@ async def vc_owner(ctx):
     await ctx.send(f"👑 Current owner: {owner.mention if owner else 'Unknown'}")
 
 
+@bot.command(name="rest-stats")
+async def rest_stats(ctx):
+    lines = []
+    depth = rest.depth()
+    for kind in rest.PRIORITIES:
+        waits = rest.waits[kind]
+        avg = sum(waits) / len(waits) * 1000 if waits else 0
+        lines.append(f"{kind}: queued {depth[kind]}, done {rest.completed[kind]}, avg wait {avg:.0f} ms")
+    lines.append(f"In flight: {rest.running}/{rest.concurrency} | 429s: {rest.rate_limited}")
+    await ctx.send("📡 **VC request scheduler**\n" + "\n".join(lines))
+
+
+@bot.command(name="vc-stats")
+async def vc_stats(ctx):
+    lines = []
+    for path, samples in vc_join_latency.items():
+        if samples:
+            ordered = sorted(samples)
+            avg = sum(ordered) / len(ordered)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            lines.append(f"{path}: {len(ordered)} joins, avg {avg * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms")
+        else:
+            lines.append(f"{path}: no joins yet")
+
+    pooled = sum(len(pool) for (gid, _), pool in vc_pool.items() if gid == ctx.guild.id)
+    lines.append(f"Ready in pool: {pooled}")
+    await ctx.send("⏱️ **Join → move latency**\n" + "\n".join(lines))
+
+
 @bot.command(name="vc-kick")
 @is_vc_owner()
 async def vc_kick(ctx, member: discord.Member):
@@ -351,7 +1267,7 @@ async def vc_kick(ctx, member: discord.Member):
         await ctx.send("❌ User is not in your voice channel.")
         return
 
-    await member.move_to(None)
+    await rest.submit("move", f"members:{ctx.guild.id}", lambda: member.move_to(None))
     await ctx.send(f"👞 Kicked {member.mention}")
 
 @bot.command(name="vc-ban")
@@ -359,10 +1275,10 @@ async def vc_kick(ctx, member: discord.Member):
 async def vc_ban(ctx, member: discord.Member):
     vc = get_user_vc(ctx)
 
-    await vc.set_permissions(member, connect=False)
+    vc_edits.set_permissions(vc, member, discord.PermissionOverwrite(connect=False))
 
     if member in vc.members:
-        await member.move_to(None)
+        await rest.submit("move", f"members:{ctx.guild.id}", lambda: member.move_to(None))
 
     await ctx.send(f"🚫 Banned {member.mention} from the channel.")
 
@@ -372,7 +1288,7 @@ async def vc_ban(ctx, member: discord.Member):
 async def vc_unban(ctx, member: discord.Member):
     vc = get_user_vc(ctx)
 
-    await vc.set_permissions(member, overwrite=None)
+    vc_edits.set_permissions(vc, member, None)
     await ctx.send(f"✅ Unbanned {member.mention}")
 
 @bot.command(name="vc-lock")
@@ -383,10 +1299,7 @@ async def vc_lock(ctx):
     if not channel or channel.id not in active_channels:
         return await ctx.send("❌ You must be in your temporary voice channel.")
 
-    await channel.set_permissions(
-        ctx.guild.default_role,
-        connect=False
-    )
+    vc_edits.set_permissions(channel, ctx.guild.default_role, discord.PermissionOverwrite(connect=False))
 
     await ctx.send("🔒 Voice channel locked. No one else can join.")
 
@@ -398,10 +1311,7 @@ async def vc_unlock(ctx):
     if not channel or channel.id not in active_channels:
         return await ctx.send("❌ You must be in your temporary voice channel.")
 
-    await channel.set_permissions(
-        ctx.guild.default_role,
-        connect=True
-    )
+    vc_edits.set_permissions(channel, ctx.guild.default_role, discord.PermissionOverwrite(connect=True))
 
     await ctx.send("🔓 Voice channel unlocked. Anyone can join.")
 
@@ -563,6 +1473,42 @@ ALLOWED_USER_IDS = [
     804005263937241138
 ]
 
+MOVE_CONCURRENCY = 5   # moves queued at once; rest caps what runs per members:{guild} route
+MOVE_SUMMARY_LINES = 15
+MENTION_ID = re.compile(r"^<(?:@!?|@&|#)(\d+)>$|^(\d+)$")
+
+
+def resolve_move_sources(guild, args):
+    # Members from mentions/IDs of users, voice channels (everyone in them)
+    # and roles (members who are in voice), deduplicated in order.
+    members, unknown = {}, []
+
+    for arg in args:
+        found = MENTION_ID.match(arg)
+        if not found:
+            unknown.append(arg)
+            continue
+        target_id = int(found.group(1) or found.group(2))
+
+        member = guild.get_member(target_id)
+        channel = guild.get_channel(target_id)
+        role = guild.get_role(target_id)
+
+        if member:
+            members.setdefault(member.id, member)
+        elif isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+            for m in channel.members:
+                members.setdefault(m.id, m)
+        elif role:
+            for m in role.members:
+                if m.voice and m.voice.channel:
+                    members.setdefault(m.id, m)
+        else:
+            unknown.append(arg)
+
+    return list(members.values()), unknown
+
+
 @bot.command()
 async def move(ctx, *args):
 
@@ -581,88 +1527,800 @@ async def move(ctx, *args):
         pass
 
     if len(args) < 2:
-        return
+        return await ctx.send("❌ Usage: `!move <@users | #voice-channel | @role ...> <channel ID>`", delete_after=15)
 
     # 🎯 Last argument = channel ID
-    try:
-        channel_id = int(args[-1])
-    except:
-        return
+    found = MENTION_ID.match(args[-1])
+    channel = ctx.guild.get_channel(int(found.group(1) or found.group(2))) if found else None
 
-    channel = ctx.guild.get_channel(channel_id)
+    if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+        return await ctx.send("❌ The last argument must be a voice channel.", delete_after=15)
 
-    if not channel or not isinstance(channel, discord.VoiceChannel):
-        return
-
-    # 👥 Get mentioned users
-    members = ctx.message.mentions
+    # 👥 Resolve users, channels and roles to members
+    members, unknown = resolve_move_sources(ctx.guild, args[:-1])
 
     if not members:
-        return
+        return await ctx.send("❌ Nobody to move.", delete_after=15)
+
+    # 🚀 Move users concurrently
+    results = {}
+
+    async def move_one(member):
+        if not (member.voice and member.voice.channel):
+            results[member] = "not in voice"
+            return "skipped"
+        if member.voice.channel.id == channel.id:
+            results[member] = "already there"
+            return "skipped"
+        try:
+            await rest.submit("move", f"members:{ctx.guild.id}", lambda: member.move_to(channel))
+        except discord.Forbidden:
+            results[member] = "missing permissions"
+            return "failed"
+        except discord.HTTPException as e:
+            results[member] = f"error {e.status}"
+            return "failed"
+        results[member] = "moved"
+        return "moved"
+
+    counts = await run_bulk(members, move_one, concurrency=MOVE_CONCURRENCY)
+
+    lines = [f"🚀 Moved {counts['moved']}/{len(members)} to {channel.mention}"]
+    problems = [(m, r) for m, r in results.items() if r != "moved"]
+    problems += [(m, "failed") for m in members if m not in results]  # raised unexpectedly
+    for member, reason in problems[:MOVE_SUMMARY_LINES]:
+        lines.append(f"• {member.display_name}: {reason}")
+    if len(problems) > MOVE_SUMMARY_LINES:
+        lines.append(f"…and {len(problems) - MOVE_SUMMARY_LINES} more")
+    if unknown:
+        lines.append(f"Unknown: {', '.join(unknown)}")
+
+    await ctx.send("\n".join(lines), delete_after=30)
+
 
-    # 🚀 Move users
-    for member in members:
-        if member.voice and member.voice.channel:
-            try:
-                await member.move_to(channel)
-            except:
-                pass
 # =========================
 # Message Moderation
 # =========================
 BAD_WORDS = {"lado", "machikney", "randi", "rando", "bhalu","arjun", "turi"}
+BAD_WORDS_DEVANAGARI = {"लाडो", "रण्डी", "रन्डी", "भालु"}
+BAD_WORDS_ALLOW = set()  # known-good words that are never flagged
+# {"default": [...], "<guild id>": [...], "allow": {"default": [...], "<guild id>": [...]}}, reloaded on change
+BAD_WORDS_FILE = "bad_words.json"
 MUSIC_CHANNEL_ID = 1462153175912943637
-BAD_WORDS_PATTERN = re.compile(
-    r"\b(" + "|".join(re.escape(word) for word in BAD_WORDS) + r")\b",
-    re.IGNORECASE
-)
-from collections import defaultdict
-
-spam_tracker = defaultdict(list)
 
-SPAM_WINDOW = 5      # seconds
-SPAM_LIMIT = 10      # detect spam
-KEEP_MESSAGES = 5    # messages to keep
-F_RESPONSES = [
-    "🎤 {user} approves this singing 👌",
-    "👏 {user} says: that was clean!",
-    "🔥 {user} enjoyed that performance!",
-    "🎶 {user} is vibing with the singer!",
-    "💯 {user} says nice vocals!"
-]
+LEET_DIGITS = str.maketrans({"4": "a", "3": "e", "1": "i", "0": "o", "5": "s", "7": "t"})
+# Symbols only count as letters inside a word, so "lado!" still ends at "o"
+LEET_SYMBOLS = {"@": "a", "$": "s", "!": "i", "+": "t"}
 
-FF_RESPONSES = [
-    "🎤🔥 {user} says THAT WAS FIRE!",
-    "👏👏 {user} is impressed with those vocals!",
-    "🎶 {user} says the singer cooked!",
-    "💯 {user} says that voice is elite!",
-    "🔥 {user} is vibing HARD to that singing!"
-]
 
-W_RESPONSES = [
-    "🚨 {user} says THAT WAS INSANE VOCALS!",
-    "🎤💀 {user} just got blown away by that singing!",
-    "🔥 {user} says the singer absolutely COOKED!",
-    "🎶 {user} says this performance was legendary!",
-    "💎 {user} says those vocals were god tier!"
-]
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
+REPEATED_LETTERS = re.compile(r"(.)\1{2,}")
 
-    content = message.content.lower()
-    # =========================
-    # 2️⃣ Bad Word Detection
-    # =========================
 
-    if content == "sankar" and message.author.id == 1139607940232384524:
-        await message.channel.send("<@696711346359894078>")
-    
-    if BAD_WORDS_PATTERN.search(message.content):
-        try:
-            await message.delete()
-        except discord.Forbidden:
+def normalize_for_match(text):
+    """
+    Fold case and leetspeak and split into words joined by single spaces.
+    Runs of one-character words are joined ("r a n d i", "r.a.n.d.i") and
+    letters repeated three or more times collapse ("raaandi"), but normal
+    words stay apart and doubled letters stay ("la do", "laddoo").
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(LEET_DIGITS)
+    words, word = [], []
+
+    for i, ch in enumerate(text):
+        if ch in LEET_SYMBOLS and i + 1 < len(text) and text[i + 1].isalnum():
+            ch = LEET_SYMBOLS[ch]
+
+        if ch.isalnum() or unicodedata.category(ch)[0] == "M":
+            word.append(ch)
+        elif word:
+            words.append("".join(word))
+            word = []
+    if word:
+        words.append("".join(word))
+
+    merged, singles = [], []
+    for word in words:
+        if len(word) == 1:
+            singles.append(word)
+            continue
+        if singles:
+            merged.append("".join(singles))
+            singles = []
+        merged.append(word)
+    if singles:
+        merged.append("".join(singles))
+
+    return " ".join(REPEATED_LETTERS.sub(r"\1", word) for word in merged)
+
+
+def whole_word(folded, start, end):
+    return (start == 0 or folded[start - 1] == " ") and (end == len(folded) - 1 or folded[end + 1] == " ")
+
+
+class AhoCorasick:
+    # One pass over the text finds every term, however many terms there are
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]  # node -> [(term length, term)]
+
+        for term in terms:
+            node = 0
+            for ch in term:
+                if ch not in self.goto[node]:
+                    self.goto[node][ch] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = self.goto[node][ch]
+            self.out[node].append((len(term), term))
+
+        # Breadth-first failure links; outputs inherit from their fail node
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter_matches(self, text):
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, term in self.out[node]:
+                yield i - length + 1, i, term
+
+
+class BadWordMatcher:
+    """
+    Per-guild bad-word automata over normalized text. Lists come from
+    BAD_WORDS (+ Devanagari variants) and BAD_WORDS_FILE, which is
+    re-read when its mtime changes (checked at most every few seconds).
+    """
+    CHECK_INTERVAL = 5  # seconds
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.last_check = 0
+        self.automata = {}  # guild id or "default" -> AhoCorasick
+        self.lists = {}
+        self.allow = {}     # guild id or "default" -> allowed words
+        self.reload()
+
+    def reload(self):
+        lists = {"default": sorted(BAD_WORDS | BAD_WORDS_DEVANAGARI)}
+        allow = {"default": sorted(BAD_WORDS_ALLOW)}
+        try:
+            self.mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, words in data.pop("allow", {}).items():
+                allow[key] = sorted(set(allow.get(key, [])) | set(words))
+            for key, words in data.items():
+                lists[key] = sorted(set(lists.get(key, [])) | set(words))  # added on top of the built-ins
+        except FileNotFoundError:
+            self.mtime = None
+        except (OSError, json.JSONDecodeError, AttributeError) as e:
+            print(f"❌ Error loading {self.path}: {e}")
+            return
+
+        self.lists = lists
+        self.allow = {key: {normalize_for_match(w) for w in words} for key, words in allow.items()}
+        self.automata = {}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self.last_check < self.CHECK_INTERVAL:
+            return
+        self.last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self.mtime:
+            self.reload()
+
+    def _automaton(self, guild_id):
+        key = str(guild_id) if str(guild_id) in self.lists else "default"
+        if key not in self.automata:
+            words = set(self.lists["default"]) | set(self.lists.get(key, []))
+            terms = {normalize_for_match(w) for w in words}
+            self.automata[key] = AhoCorasick(t for t in terms if t)
+        return self.automata[key]
+
+    def find(self, guild, text):
+        """Return the first bad word found in text (as whole words), or None."""
+        self._maybe_reload()
+        folded = normalize_for_match(text)
+        guild_id = str(guild.id) if guild else "default"
+        automaton = self._automaton(guild_id)
+        allowed = self.allow["default"] | self.allow.get(guild_id, set())
+
+        for start, end, term in automaton.iter_matches(folded):
+            if whole_word(folded, start, end) and term not in allowed:
+                return term
+        return None
+
+
+bad_words = BadWordMatcher(BAD_WORDS_FILE)
+
+
+def benchmark_bad_words(term_counts=(10, 1000, 10000), messages=2000):
+    # Messages/second of the old \b-alternation regex vs the normalized automaton
+    rng = random.Random(42)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocab = ["hello", "bro", "game", "kasto", "cha", "ramro", "singing", "ff", "lol", "khana", "vayo", "ho"]
+    texts = [" ".join(rng.choice(vocab) for _ in range(rng.randint(3, 25))) for _ in range(messages)]
+    lines = []
+
+    for count in term_counts:
+        terms = {"".join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(count)}
+        terms |= BAD_WORDS
+
+        pattern = re.compile(r"\b(" + "|".join(re.escape(w) for w in terms) + r")\b", re.IGNORECASE)
+        started = time.perf_counter()
+        for text in texts:
+            pattern.search(text)
+        regex_rate = messages / (time.perf_counter() - started)
+
+        automaton = AhoCorasick({normalize_for_match(w) for w in terms})
+        started = time.perf_counter()
+        for text in texts:
+            folded = normalize_for_match(text)
+            for start, end, _ in automaton.iter_matches(folded):
+                if whole_word(folded, start, end):
+                    break
+        ac_rate = messages / (time.perf_counter() - started)
+
+        lines.append(f"{count} terms: regex {regex_rate:,.0f} msg/s | automaton {ac_rate:,.0f} msg/s")
+
+    return lines
+
+
+@bot.command(name="badwords-reload")
+async def badwords_reload(ctx):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+    bad_words.reload()
+    lists = ", ".join(f"{key}: {len(words)}" for key, words in bad_words.lists.items())
+    await ctx.send(f"✅ Bad word lists reloaded ({lists}).")
+
+
+@bot.command(name="badwords-bench")
+async def badwords_bench(ctx):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+    msg = await ctx.send("⏱️ Benchmarking bad word matching...")
+    lines = await asyncio.to_thread(benchmark_bad_words)
+    await msg.edit(content="⏱️ **Bad word matching**\n" + "\n".join(lines))
+from collections import defaultdict
+
+SPAM_WINDOW = 5      # seconds
+SPAM_LIMIT = 10      # detect spam
+SPAM_CHANNELS = {}   # channel id -> (window, limit) overrides
+KEEP_MESSAGES = 5    # messages to keep
+
+
+class SpamTracker:
+    # Sliding window per (channel, user): a deque capped at limit + 1
+    # timestamps, so each message is O(1) and memory per user is bounded.
+    # A background sweep drops users who have been idle for a whole window.
+    SWEEP_INTERVAL = 30  # seconds
+
+    def __init__(self, window, limit, overrides=None, clock=time.monotonic):
+        self.window = window
+        self.limit = limit
+        self.overrides = overrides or {}
+        self.clock = clock
+        self.hits = {}  # (channel id, user id) -> deque of timestamps
+        self.evictions = 0
+        self.task = None
+
+    def config(self, channel_id):
+        return self.overrides.get(channel_id, (self.window, self.limit))
+
+    def hit(self, channel_id, user_id):
+        """Record a message; True if the user is over the channel's limit."""
+        window, limit = self.config(channel_id)
+        now = self.clock()
+        key = (channel_id, user_id)
+
+        stamps = self.hits.get(key)
+        if stamps is None:
+            stamps = self.hits[key] = deque(maxlen=limit + 1)
+        stamps.append(now)
+
+        while stamps and now - stamps[0] >= window:
+            stamps.popleft()
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._sweep())
+
+        return len(stamps) > limit
+
+    def sweep(self):
+        now = self.clock()
+        idle = [
+            key for key, stamps in self.hits.items()
+            if not stamps or now - stamps[-1] >= self.config(key[0])[0]
+        ]
+        for key in idle:
+            del self.hits[key]
+        self.evictions += len(idle)
+
+    async def _sweep(self):
+        while self.hits:
+            await asyncio.sleep(self.SWEEP_INTERVAL)
+            self.sweep()
+
+
+spam_tracker = SpamTracker(SPAM_WINDOW, SPAM_LIMIT, SPAM_CHANNELS)
+
+RECENT_MESSAGES_PER_CHANNEL = 50
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60  # Discord refuses bulk deletes past 14 days
+
+
+class RecentMessages:
+    # Last few trigger messages per channel as (id, author id, content),
+    # so spam cleanup never has to fetch channel history.
+    def __init__(self, size):
+        self.size = size
+        self.channels = defaultdict(lambda: deque(maxlen=self.size))
+
+    def add(self, message, content):
+        self.channels[message.channel.id].append((message.id, message.author.id, content))
+
+    def matching(self, channel_id, author_id, content):
+        """IDs of the author's messages with this content, newest first."""
+        return [
+            mid for mid, aid, text in reversed(self.channels.get(channel_id, ()))
+            if aid == author_id and text == content
+        ]
+
+    def forget(self, channel_id, ids):
+        ids = set(ids)
+        entries = self.channels.get(channel_id)
+        if entries:
+            kept = [entry for entry in entries if entry[0] not in ids]
+            entries.clear()
+            entries.extend(kept)
+
+
+recent_messages = RecentMessages(RECENT_MESSAGES_PER_CHANNEL)
+
+
+async def purge_messages(channel, ids):
+    # One bulk call for everything Discord allows, singles for the rest
+    if not ids:
+        return
+    recent_messages.forget(channel.id, ids)
+
+    now = discord.utils.utcnow()
+    young = [mid for mid in ids if (now - discord.utils.snowflake_time(mid)).total_seconds() < BULK_DELETE_MAX_AGE]
+    old = [mid for mid in ids if mid not in young]
+
+    try:
+        for i in range(0, len(young), 100):
+            await channel.delete_messages([discord.Object(id=mid) for mid in young[i:i + 100]])
+    except discord.HTTPException:
+        old = ids  # bulk delete refused, fall back to singles
+
+    for mid in old:
+        try:
+            await channel.get_partial_message(mid).delete()
+        except discord.HTTPException:
+            pass
+
+
+@bot.command(name="spam-stats")
+async def spam_stats(ctx):
+    window, limit = spam_tracker.config(MUSIC_CHANNEL_ID)
+    await ctx.send(
+        f"📊 **Spam tracker**\n"
+        f"Tracked users: {len(spam_tracker.hits)} | Evicted: {spam_tracker.evictions}\n"
+        f"Music channel: {limit} messages / {window}s"
+    )
+F_RESPONSES = [
+    "🎤 {user} approves this singing 👌",
+    "👏 {user} says: that was clean!",
+    "🔥 {user} enjoyed that performance!",
+    "🎶 {user} is vibing with the singer!",
+    "💯 {user} says nice vocals!"
+]
+
+FF_RESPONSES = [
+    "🎤🔥 {user} says THAT WAS FIRE!",
+    "👏👏 {user} is impressed with those vocals!",
+    "🎶 {user} says the singer cooked!",
+    "💯 {user} says that voice is elite!",
+    "🔥 {user} is vibing HARD to that singing!"
+]
+
+W_RESPONSES = [
+    "🚨 {user} says THAT WAS INSANE VOCALS!",
+    "🎤💀 {user} just got blown away by that singing!",
+    "🔥 {user} says the singer absolutely COOKED!",
+    "🎶 {user} says this performance was legendary!",
+    "💎 {user} says those vocals were god tier!"
+]
+UFF_RESPONSE = "🎧 {user} after hearing those vocals!"
+UFF_GIF = "https://static.klipy.com/ii/35ccce3d852f7995dd2da910f2abd795/25/03/7fBW7jWy.gif"
+
+# Hype meter: one live message per performance instead of one per reaction
+HYPE_CONFIG = {
+    "ENABLED": os.getenv("HYPE_METER", "1") == "1",
+    "EDIT_INTERVAL": 3,   # seconds between edits of the live message
+    "IDLE": 45,           # seconds without reactions that end a performance
+}
+HYPE_LABELS = {"f": "👌 F", "ff": "🔥 FF", "w": "🚨 W", "uff": "🎧 UFF"}
+
+
+class _Performance:
+    __slots__ = ("counts", "reactors", "latest", "latest_image", "last", "version", "message", "task")
+
+    def __init__(self):
+        self.counts = {trigger: 0 for trigger in HYPE_LABELS}
+        self.reactors = defaultdict(int)  # user id -> reactions
+        self.latest = ""
+        self.latest_image = None
+        self.last = 0
+        self.version = 0
+        self.message = None
+        self.task = None
+
+
+class HypeMeter:
+    """
+    Aggregates f/ff/w/uff per channel. The first reaction of a performance
+    posts the meter, later ones only bump counters, and a worker edits the
+    message at most every EDIT_INTERVAL until the channel goes quiet.
+    """
+    def __init__(self, edit_interval, idle, clock=time.monotonic):
+        self.edit_interval = edit_interval
+        self.idle = idle
+        self.clock = clock
+        self.performances = {}  # channel id -> _Performance
+        self.reactions = 0
+        self.sends = 0
+        self.edits = 0
+
+    def record(self, message, trigger, line, image=None):
+        now = self.clock()
+        perf = self.performances.get(message.channel.id)
+        if perf is None or now - perf.last > self.idle:
+            perf = self.performances[message.channel.id] = _Performance()
+
+        perf.counts[trigger] = perf.counts.get(trigger, 0) + 1
+        perf.reactors[message.author.id] += 1
+        perf.latest = line
+        perf.latest_image = image
+        perf.last = now
+        perf.version += 1
+        self.reactions += 1
+
+        if perf.task is None:
+            perf.task = asyncio.create_task(self._run(message.channel, perf))
+
+    def render(self, perf):
+        total = sum(perf.counts.values())
+        embed = discord.Embed(title="🎤 Hype Meter", description=perf.latest, color=0xff4500)
+
+        for trigger, count in perf.counts.items():
+            if count:
+                label = HYPE_LABELS.get(trigger, trigger.upper())
+                embed.add_field(name=label, value=f"{'▰' * min(count, 10)} {count}", inline=True)
+
+        top = sorted(perf.reactors.items(), key=lambda item: item[1], reverse=True)[:3]
+        embed.add_field(
+            name="Top hype",
+            value="\n".join(f"<@{uid}> × {count}" for uid, count in top),
+            inline=False
+        )
+        if perf.latest_image:
+            embed.set_image(url=perf.latest_image)
+        embed.set_footer(text=f"{total} reactions")
+        return embed
+
+    async def _run(self, channel, perf):
+        try:
+            shown = perf.version
+            perf.message = await channel.send(embed=self.render(perf))
+            self.sends += 1
+
+            while True:
+                await asyncio.sleep(self.edit_interval)
+                if perf.version != shown:
+                    shown = perf.version
+                    await perf.message.edit(embed=self.render(perf))
+                    self.edits += 1
+                elif self.clock() - perf.last > self.idle:
+                    break
+        except discord.HTTPException as e:
+            print(f"❌ Hype meter update failed in {channel.id}: {e}")
+        finally:
+            if self.performances.get(channel.id) is perf:
+                del self.performances[channel.id]
+
+
+hype_meter = HypeMeter(HYPE_CONFIG["EDIT_INTERVAL"], HYPE_CONFIG["IDLE"])
+
+
+@bot.command(name="hype-stats")
+async def hype_stats(ctx):
+    mode = "meter" if HYPE_CONFIG["ENABLED"] else "one message per reaction"
+    await ctx.send(
+        f"🎤 **Hype** ({mode})\n"
+        f"Reactions: {hype_meter.reactions} | Bot sends: {hype_meter.sends} | Edits: {hype_meter.edits}\n"
+        f"Live performances: {len(hype_meter.performances)}"
+    )
+
+
+# =========================
+# Trigger Engine
+# =========================
+TRIGGERS_FILE = "triggers.json"  # {"triggers": [rule, ...]}, added to DEFAULT_TRIGGERS, reloaded on change
+TRIGGER_MATCHES = ("exact", "prefix", "regex")
+INLINE_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+# Rule keys: name, match (exact|prefix|regex), pattern, channels, users,
+# cooldown (seconds, per channel), responses ({user} = author mention),
+# image, action ("reply" or "hype" for the music-channel meter)
+DEFAULT_TRIGGERS = [
+    {"name": "sankar", "match": "exact", "pattern": "sankar",
+     "users": [1139607940232384524], "responses": ["<@696711346359894078>"]},
+    {"name": "f", "match": "exact", "pattern": "f", "channels": [MUSIC_CHANNEL_ID],
+     "action": "hype", "responses": F_RESPONSES},
+    {"name": "ff", "match": "exact", "pattern": "ff", "channels": [MUSIC_CHANNEL_ID],
+     "action": "hype", "responses": FF_RESPONSES},
+    {"name": "w", "match": "exact", "pattern": "w", "channels": [MUSIC_CHANNEL_ID],
+     "action": "hype", "responses": W_RESPONSES},
+    {"name": "uff", "match": "exact", "pattern": "uff", "channels": [MUSIC_CHANNEL_ID],
+     "action": "hype", "responses": [UFF_RESPONSE], "image": UFF_GIF},
+]
+
+
+class TriggerRule:
+    __slots__ = ("name", "match", "pattern", "compiled", "users", "cooldown", "responses", "image", "action")
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.match = spec.get("match", "exact")
+        if self.match not in TRIGGER_MATCHES:
+            raise ValueError(f"trigger {self.name!r}: unknown match {self.match!r}")
+        self.pattern = spec["pattern"] if self.match == "regex" else spec["pattern"].lower().strip()
+        # Validated on its own, so one rule's groups or flags can't break another
+        try:
+            self.compiled = re.compile(self.pattern, re.IGNORECASE) if self.match == "regex" else None
+        except re.error as e:
+            raise ValueError(f"trigger {self.name!r}: bad regex ({e})")
+        self.users = set(spec.get("users", ())) or None
+        self.cooldown = spec.get("cooldown", 0)
+        self.responses = spec.get("responses", [])
+        self.image = spec.get("image")
+        self.action = spec.get("action", "reply")
+
+    def line(self, member):
+        return random.choice(self.responses).format(user=member.mention) if self.responses else None
+
+
+class _TriggerTable:
+    # Dispatch for one channel (or the global scope): exact matches are a
+    # dict lookup, prefixes a lookup per distinct prefix length, and plain
+    # regexes run as one combined pattern. Regexes with their own groups or
+    # inline flags can't be spliced into it and are scanned one by one.
+    def __init__(self, rules):
+        self.exact = defaultdict(list)
+        self.prefix = defaultdict(list)
+        self.prefix_lengths = []
+        self.regex_rules = {}  # group name -> rule, in config order
+        self.combined = set()  # groups covered by self.regex
+        self.regex = None
+        parts = []
+
+        for rule in rules:
+            if rule.match == "exact":
+                self.exact[rule.pattern].append(rule)
+            elif rule.match == "prefix":
+                self.prefix[rule.pattern].append(rule)
+            else:
+                group = f"r{len(self.regex_rules)}"
+                self.regex_rules[group] = rule
+                if rule.compiled.groups == 0 and not INLINE_FLAGS.match(rule.pattern):
+                    self.combined.add(group)
+                    parts.append(f"(?P<{group}>{rule.pattern})")
+
+        self.prefix_lengths = sorted({len(p) for p in self.prefix}, reverse=True)
+        if parts:
+            try:
+                self.regex = re.compile("|".join(parts), re.IGNORECASE)
+            except re.error:
+                self.combined = set()  # scan every rule on its own instead
+
+    def candidates(self, content):
+        yield from self.exact.get(content, ())
+        for length in self.prefix_lengths:
+            yield from self.prefix.get(content[:length], ())
+        if not self.regex_rules:
+            return
+
+        found = self.regex.search(content) if self.combined else None
+        first = found.lastgroup if found else None
+        if first:
+            yield self.regex_rules[first]
+
+        # The combined pattern reports one match; later candidates are only
+        # needed when that rule was filtered out (users/cooldown) or for the
+        # rules scanned singly
+        for group, rule in self.regex_rules.items():
+            if group == first or (group in self.combined and not found):
+                continue
+            if rule.compiled.search(content):
+                yield rule
+
+
+class TriggerEngine:
+    """
+    Compiles DEFAULT_TRIGGERS plus TRIGGERS_FILE into per-channel dispatch
+    tables; the file is re-read when its mtime changes.
+    """
+    CHECK_INTERVAL = 5  # seconds
+
+    def __init__(self, path, defaults, clock=time.monotonic):
+        self.path = path
+        self.defaults = defaults
+        self.clock = clock
+        self.mtime = None
+        self.last_check = 0
+        self.tables = {}     # channel id or None (any channel) -> _TriggerTable
+        self.count = 0
+        self.fired = {}      # (rule name, channel id) -> last fire time
+        self.reload()
+
+    def reload(self):
+        specs = list(self.defaults)
+        try:
+            if self.path:
+                self.mtime = os.path.getmtime(self.path)
+                with open(self.path, "r", encoding="utf-8") as f:
+                    specs += json.load(f).get("triggers", [])
+        except FileNotFoundError:
+            self.mtime = None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Error loading {self.path}: {e}")
+            return False
+
+        try:
+            self.compile(specs)
+        except (KeyError, ValueError, re.error) as e:
+            print(f"❌ Invalid trigger in {self.path}: {e}")
+            return False
+        return True
+
+    def compile(self, specs):
+        rules = [TriggerRule(spec) for spec in specs]
+        scoped = defaultdict(list)
+        for spec, rule in zip(specs, rules):
+            for channel_id in spec.get("channels") or [None]:
+                scoped[channel_id].append(rule)
+
+        # Channel tables include the global rules so a lookup is one table
+        global_rules = scoped.get(None, [])
+        tables = {None: _TriggerTable(global_rules)}
+        for channel_id, channel_rules in scoped.items():
+            if channel_id is not None:
+                tables[channel_id] = _TriggerTable(channel_rules + global_rules)
+
+        self.tables = tables
+        self.count = len(rules)
+
+    def _maybe_reload(self):
+        now = self.clock()
+        if not self.path or now - self.last_check < self.CHECK_INTERVAL:
+            return
+        self.last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self.mtime:
+            self.reload()
+
+    def match(self, message, content):
+        """First rule that fires for this message, or None."""
+        self._maybe_reload()
+        table = self.tables.get(message.channel.id) or self.tables[None]
+
+        for rule in table.candidates(content):
+            if rule.users and message.author.id not in rule.users:
+                continue
+            if rule.cooldown:
+                key = (rule.name, message.channel.id)
+                now = self.clock()
+                if now - self.fired.get(key, -rule.cooldown) < rule.cooldown:
+                    continue
+                self.fired[key] = now
+            return rule
+        return None
+
+
+triggers = TriggerEngine(TRIGGERS_FILE, DEFAULT_TRIGGERS)
+
+
+class _BenchMessage:
+    __slots__ = ("channel", "author")
+
+    def __init__(self, channel_id, author_id):
+        self.channel = discord.Object(id=channel_id)
+        self.author = discord.Object(id=author_id)
+
+
+def benchmark_triggers(extra=(0, 500), messages=20000):
+    # Messages/second through TriggerEngine.match as synthetic rules are added
+    rng = random.Random(7)
+    words = ["f", "ff", "w", "uff", "hello", "sankar", "gg", "kasto cha", "!ai hi", "lol nice"]
+    channels = [MUSIC_CHANNEL_ID, 1, 2, 3]
+    sample = [
+        (_BenchMessage(rng.choice(channels), rng.randint(1, 50)), rng.choice(words))
+        for _ in range(messages)
+    ]
+    lines = []
+
+    for count in extra:
+        specs = list(DEFAULT_TRIGGERS)
+        for i in range(count):
+            kind = ("exact", "prefix")[i % 2]
+            specs.append({"name": f"bench{i}", "match": kind, "pattern": f"bench{i}",
+                          "channels": [rng.choice(channels)], "responses": ["x"]})
+
+        engine = TriggerEngine(None, [])
+        engine.compile(specs)
+
+        started = time.perf_counter()
+        for message, content in sample:
+            engine.match(message, content)
+        rate = messages / (time.perf_counter() - started)
+        lines.append(f"{engine.count} triggers: {rate:,.0f} msg/s")
+
+    return lines
+
+
+@bot.command(name="triggers-reload")
+async def triggers_reload(ctx):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+    if triggers.reload():
+        await ctx.send(f"✅ Loaded {triggers.count} triggers.")
+    else:
+        await ctx.send(f"❌ `{TRIGGERS_FILE}` is invalid, keeping the previous triggers.")
+
+
+@bot.command(name="triggers-bench")
+async def triggers_bench(ctx):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+    lines = await asyncio.to_thread(benchmark_triggers)
+    await ctx.send("⏱️ **Trigger dispatch**\n" + "\n".join(lines))
+
+
+@bot.event
+async def on_message(message):
+    if message.author.bot:
+        return
+
+    # =========================
+    # 2️⃣ Bad Word Detection
+    # =========================
+    if bad_words.find(message.guild, message.content):
+        try:
+            await message.delete()
+        except discord.Forbidden:
             pass
 
         embed = discord.Embed(color=0xff0000)
@@ -673,112 +2331,986 @@ async def on_message(message):
             embed=embed,
             delete_after=5
         )
-        return
+        return
+
+    # =========================
+    # 3️⃣ Word Triggers
+    # =========================
+    content = message.content.lower().strip()
+    rule = triggers.match(message, content)
+
+    if rule and rule.action == "hype":
+        recent_messages.add(message, content)
+
+        # If spam detected: delete extra messages (keep the newest 5)
+        spamming = spam_tracker.hit(message.channel.id, message.author.id)
+        if spamming:
+            ids = recent_messages.matching(message.channel.id, message.author.id, content)
+            await purge_messages(message.channel, ids[KEEP_MESSAGES:])
+
+        if HYPE_CONFIG["ENABLED"]:
+            if not spamming:
+                hype_meter.record(message, rule.name, rule.line(message.author), rule.image)
+            rule = None
+
+    if rule and (rule.responses or rule.image):
+        embed = None
+        if rule.image:
+            embed = discord.Embed(color=0xff0000)
+            embed.set_image(url=rule.image)
+        await message.channel.send(rule.line(message.author), embed=embed)
+
+    await bot.process_commands(message)
+
+# =========================
+# AI
+# =========================
+GEMINI_KEY = os.getenv("GEMINI_API_KEY")
+
+AI_CONFIG = {
+    "BACKEND": os.getenv("AI_BACKEND", "gemini"),  # "gemini" or "fake"
+    "MODEL": "gemini-2.5-flash",
+    "MAX_CONCURRENT": int(os.getenv("AI_MAX_CONCURRENT", "4")),
+    "QUEUE_SIZE": 20,             # waiting requests before new ones are rejected
+    "USER_RATE": 1 / 30,          # requests per second refilled per user
+    "USER_BURST": 3,
+    "GUILD_RATE": 1 / 6,          # requests per second refilled per guild
+    "GUILD_BURST": 10,
+    "TIMEOUT": float(os.getenv("AI_TIMEOUT", "30")),  # seconds per request
+    "FAKE_LATENCY": float(os.getenv("AI_FAKE_LATENCY", "2")),
+    "STREAM": os.getenv("AI_STREAM", "1") == "1",
+    "STREAM_EDIT_INTERVAL": 1.5,  # seconds between edits (Discord allows 5 edits / 5s)
+    "CACHE_SIZE": 256,            # max cached answers
+    "CACHE_MAX_CHARS": 500_000,   # max total cached text
+    "CACHE_TTL": 6 * 3600,        # seconds
+    "CACHE_FILE": os.getenv("AI_CACHE_FILE"),  # None = memory only
+    "CHAT_TOKEN_BUDGET": 1500,    # history kept per channel in conversational mode
+    "CHAT_TURN_CHARS": 1500,      # longest single turn kept in history
+    "CHAT_SUMMARY_CHARS": 600,    # gist of dropped turns
+    "CHAT_MAX_CHANNELS": 200,
+    "CHAT_IDLE_TTL": 3600         # seconds before an idle conversation is forgotten
+}
+
+MESSAGE_LIMIT = 2000
+
+
+class GeminiBackend:
+    def __init__(self, model_name):
+        genai.configure(api_key=GEMINI_KEY)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt):
+        # Async client: the request never blocks the gateway loop
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    # Local stand-in for Gemini (no network), used to test latency isolation
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"[fake] {prompt}"
+
+    async def stream(self, prompt):
+        self.calls += 1
+        words = f"[fake] {prompt}".split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+
+def create_ai_backend():
+    if AI_CONFIG["BACKEND"] == "fake":
+        return FakeBackend(AI_CONFIG["FAKE_LATENCY"])
+    return GeminiBackend(AI_CONFIG["MODEL"])
+
+
+def normalize_prompt(prompt):
+    # Fold case, punctuation and whitespace so trivially different questions share an answer
+    prompt = re.sub(r"[^\w\s]", "", prompt.casefold())
+    return " ".join(prompt.split())
+
+
+class ResponseCache(WriteBehind):
+    # LRU + TTL cache of AI answers, bounded by entry count and total characters.
+    # With a path, changes are written behind (coalesced, one writer at a time).
+    def __init__(self, max_entries, max_chars, ttl, path=None, clock=time.time):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (text, expires_at)
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.deduped = 0
+        self.inflight = {}  # key -> future resolved when the running request ends
+
+        if path:
+            self._load()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+
+        if entry is None or entry[1] <= self.clock():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, text):
+        if not text or len(text) > self.max_chars:
+            return
+
+        if key in self.entries:
+            self._drop(key)
+
+        self.entries[key] = (text, self.clock() + self.ttl)
+        self.chars += len(text)
+
+        while len(self.entries) > self.max_entries or self.chars > self.max_chars:
+            _, (old, _) = self.entries.popitem(last=False)
+            self.chars -= len(old)
+
+        if self.path:
+            self._mark_dirty()
+
+    def clear(self):
+        self.entries.clear()
+        self.chars = 0
+        if self.path:
+            self._mark_dirty()
+
+    def _drop(self, key):
+        text, _ = self.entries.pop(key)
+        self.chars -= len(text)
+
+    def _load(self):
+        now = self.clock()
+        for key, text, expires in self.read_json([]):
+            if expires > now:
+                self.entries[key] = (text, expires)
+                self.chars += len(text)
+
+    def snapshot(self):
+        return [[k, t, e] for k, (t, e) in self.entries.items()]
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TokenBucket:
+    # Lazy refill: tokens are recomputed from elapsed time when touched, no timers
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self, now, cost=1):
+        self.refill(now)
+        if self.tokens >= cost:
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class AIScheduler:
+    # Admission via per-user and per-guild token buckets, then a bounded queue
+    # that hands out backend slots by priority and round-robin across users
+    MAX_BUCKETS = 10_000
+
+    def __init__(self, slots, max_queue, user_rate, user_burst, guild_rate, guild_burst, clock=time.monotonic):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.user_limit = (user_rate, user_burst)
+        self.guild_limit = (guild_rate, guild_burst)
+        self.clock = clock
+        self.user_buckets = {}
+        self.guild_buckets = {}
+        self.levels = {}  # priority -> OrderedDict(user id -> deque of waiters), order = rotation
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+
+    def admit(self, user_id, guild_id):
+        now = self.clock()
+        user = self._bucket(self.user_buckets, user_id, self.user_limit, now)
+        guild = self._bucket(self.guild_buckets, guild_id, self.guild_limit, now)
+
+        wait = max(user.retry_after(now), guild.retry_after(now))
+        if wait:
+            self.rejected += 1
+            raise RateLimited(wait)
+
+        user.tokens -= 1
+        guild.tokens -= 1
+
+    def _bucket(self, buckets, key, limit, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self.MAX_BUCKETS:
+                # Full buckets carry no state worth keeping
+                for k in [k for k, b in buckets.items() if b.retry_after(now, b.capacity) == 0]:
+                    del buckets[k]
+            bucket = buckets[key] = TokenBucket(*limit, now)
+        return bucket
+
+    @asynccontextmanager
+    async def turn(self, user_id, priority=1, on_queued=None):
+        if self.running < self.slots and not self.queued:
+            self.running += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull()
+
+            waiter = asyncio.get_running_loop().create_future()
+            users = self.levels.setdefault(priority, OrderedDict())
+            users.setdefault(user_id, deque()).append(waiter)
+            self.queued += 1
+
+            try:
+                if on_queued:
+                    await on_queued(self.position(priority, user_id, waiter))
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # a slot was already handed to us
+                else:
+                    waiter.cancel()
+                    self._remove(priority, user_id, waiter)
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def position(self, priority, user_id, waiter):
+        # Round-robin serves one job per user per round, so count what runs first
+        ahead = sum(len(w) for p, users in self.levels.items() if p < priority for w in users.values())
+        users = self.levels[priority]
+        k = users[user_id].index(waiter)
+        before = True
+
+        for uid, waiters in users.items():
+            if uid == user_id:
+                before = False
+                continue
+            ahead += min(len(waiters), k + 1 if before else k)
+
+        return ahead + k + 1
+
+    def _remove(self, priority, user_id, waiter):
+        users = self.levels[priority]
+        waiters = users[user_id]
+        waiters.remove(waiter)
+        if not waiters:
+            del users[user_id]
+        self.queued -= 1
+
+    def _release(self):
+        self.running -= 1
+
+        while self.running < self.slots and self.queued:
+            users = self.levels[min(p for p, u in self.levels.items() if u)]
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+
+            # Move the user to the back of the rotation
+            del users[user_id]
+            if waiters:
+                users[user_id] = waiters
+
+            self.queued -= 1
+            self.running += 1
+            waiter.set_result(None)
+
+
+def estimate_tokens(text):
+    # Rough but cheap: ~4 characters per token for English/romanized text
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    __slots__ = ("turns", "summary", "tokens", "last_used")
+
+    def __init__(self, now):
+        self.turns = deque()  # (speaker, text)
+        self.summary = ""
+        self.tokens = 0
+        self.last_used = now
+
+    def add(self, speaker, text):
+        text = text[:AI_CONFIG["CHAT_TURN_CHARS"]]
+        self.turns.append((speaker, text))
+        self.tokens += estimate_tokens(text)
+
+        # Drop the oldest turns past the budget, keeping their first sentence as a gist
+        while self.tokens > AI_CONFIG["CHAT_TOKEN_BUDGET"] and len(self.turns) > 2:
+            old_speaker, old = self.turns.popleft()
+            self.tokens -= estimate_tokens(old)
+            gist = re.split(r"(?<=[.!?])\s", old, maxsplit=1)[0][:120]
+            self.summary = f"{self.summary} {old_speaker}: {gist}"[-AI_CONFIG["CHAT_SUMMARY_CHARS"]:]
+
+    def render(self, speaker, prompt):
+        lines = ["You are chatting in a Discord channel. Continue the conversation."]
+        if self.summary:
+            lines.append(f"Earlier (summary):{self.summary}")
+        lines.extend(f"{who}: {text}" for who, text in self.turns)
+        lines.append(f"{speaker}: {prompt}")
+        lines.append("Assistant:")
+        return "\n".join(lines)
+
+
+class ConversationMemory:
+    # Per-channel rolling histories kept in LRU order, so idle and
+    # least-recently-used channels are evicted from the front in O(1)
+    def __init__(self, max_channels, idle_ttl, clock=time.monotonic):
+        self.max_channels = max_channels
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.channels = OrderedDict()
+        self.evicted = 0
+
+    def get(self, channel_id):
+        now = self.clock()
+        self._evict_idle(now)
+
+        conversation = self.channels.get(channel_id)
+        if conversation is None:
+            conversation = self.channels[channel_id] = Conversation(now)
+            while len(self.channels) > self.max_channels:
+                self.channels.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.channels.move_to_end(channel_id)
+
+        conversation.last_used = now
+        return conversation
+
+    def forget(self, channel_id):
+        self.channels.pop(channel_id, None)
+
+    def _evict_idle(self, now):
+        while self.channels:
+            conversation = next(iter(self.channels.values()))
+            if now - conversation.last_used < self.idle_ttl:
+                break
+            self.channels.popitem(last=False)
+            self.evicted += 1
+
+
+ai_backend = create_ai_backend()
+ai_cache = ResponseCache(
+    AI_CONFIG["CACHE_SIZE"],
+    AI_CONFIG["CACHE_MAX_CHARS"],
+    AI_CONFIG["CACHE_TTL"],
+    AI_CONFIG["CACHE_FILE"]
+)
+ai_scheduler = AIScheduler(
+    AI_CONFIG["MAX_CONCURRENT"],
+    AI_CONFIG["QUEUE_SIZE"],
+    AI_CONFIG["USER_RATE"],
+    AI_CONFIG["USER_BURST"],
+    AI_CONFIG["GUILD_RATE"],
+    AI_CONFIG["GUILD_BURST"]
+)
+ai_tasks = defaultdict(set)  # user id -> in-flight request tasks
+ai_memory = ConversationMemory(AI_CONFIG["CHAT_MAX_CHANNELS"], AI_CONFIG["CHAT_IDLE_TTL"])
+ai_chat_channels = set()  # channels/threads with conversational mode on
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """
+    Split text into (head, rest) where head fits in one Discord message.
+    Prefers paragraph, then line, then word boundaries, and closes/reopens
+    a code fence that would otherwise be cut in half.
+    """
+    if len(text) <= limit:
+        return text, ""
+
+    window = text[:limit - 8]  # room to close an open code fence
+    cut, skip = len(window), 0
+    for sep in ("\n\n", "\n", " "):
+        idx = window.rfind(sep)
+        if idx > limit // 2:
+            cut, skip = idx, len(sep)
+            break
+
+    head, rest = text[:cut], text[cut + skip:]
+
+    fences = re.findall(r"```(\S*)", head)
+    if len(fences) % 2 == 1:
+        head += "\n```"
+        rest = f"```{fences[-1]}\n" + rest
+
+    return head, rest
+
+
+class StreamingReply:
+    # Grows a reply as text arrives: the first message goes out on the first
+    # chunk, edits are throttled, and overflow continues in a new message
+    def __init__(self, ctx, interval=AI_CONFIG["STREAM_EDIT_INTERVAL"]):
+        self.ctx = ctx
+        self.interval = interval
+        self.message = None
+        self.text = ""   # content of the message currently being written
+        self.shown = ""  # what Discord currently displays for it
+        self.last_edit = 0
+        self.sent = 0
+
+    async def feed(self, chunk):
+        self.text += chunk
+
+        while len(self.text) > MESSAGE_LIMIT:
+            head, self.text = split_message(self.text)
+            await self._show(head, force=True)
+            self.message = None
+            self.shown = ""
+
+        await self._show(self.text)
+
+    async def finish(self):
+        await self._show(self.text, force=True)
+
+    async def _show(self, content, force=False):
+        if not content.strip() or content == self.shown:
+            return
+
+        now = time.monotonic()
+
+        if self.message is None:
+            if self.sent == 0:
+                self.message = await self.ctx.reply(content)
+            else:
+                self.message = await self.ctx.send(content)
+            self.sent += 1
+        elif force or now - self.last_edit >= self.interval:
+            await self.message.edit(content=content)
+        else:
+            return
+
+        self.shown = content
+        self.last_edit = now
+
+
+async def ai_call(ctx, prompt, reply):
+    parts = []
+    status = None
+
+    async def queued(position):
+        nonlocal status
+        status = await ctx.reply(f"⏳ You are #{position} in the AI queue.")
+
+    priority = 0 if ctx.author.id in Admins else 1
+    async with ai_scheduler.turn(ctx.author.id, priority, queued):
+        if status:
+            try:
+                await status.delete()
+            except discord.HTTPException:
+                pass
+
+        async with asyncio.timeout(AI_CONFIG["TIMEOUT"]):
+            if AI_CONFIG["STREAM"]:
+                async for chunk in ai_backend.stream(prompt):
+                    parts.append(chunk)
+                    await reply.feed(chunk)
+            else:
+                parts.append(await ai_backend.generate(prompt))
+                await reply.feed(parts[0])
+
+            await reply.finish()
+
+    return "".join(parts)
+
+
+async def ai_respond(ctx, prompt):
+    reply = StreamingReply(ctx)
+
+    # Conversational answers depend on history, so they bypass the cache
+    if ctx.channel.id in ai_chat_channels:
+        conversation = ai_memory.get(ctx.channel.id)
+        speaker = ctx.author.display_name
+        text = await ai_call(ctx, conversation.render(speaker, prompt), reply)
+        conversation.add(speaker, prompt)
+        conversation.add("Assistant", text)
+        return
+
+    key = normalize_prompt(prompt)
+
+    # Serve from cache, or share an identical request that is already running
+    while True:
+        text = ai_cache.get(key)
+        pending = ai_cache.inflight.get(key)
+        if text is not None or pending is None:
+            break
+        ai_cache.deduped += 1
+        await asyncio.wait([pending])
+
+    if text is not None:
+        await reply.feed(text)
+        await reply.finish()
+        return
+
+    done = asyncio.get_running_loop().create_future()
+    ai_cache.inflight[key] = done
+
+    try:
+        ai_cache.put(key, await ai_call(ctx, prompt, reply))
+    finally:
+        ai_cache.inflight.pop(key, None)
+        done.set_result(None)
+
+
+@bot.command()
+async def ai(ctx, *, prompt):
+    try:
+        ai_scheduler.admit(ctx.author.id, ctx.guild.id if ctx.guild else 0)
+    except RateLimited as e:
+        await ctx.reply(f"⏳ Slow down! Try again in {math.ceil(e.retry_after)}s.")
+        return
+
+    task = asyncio.create_task(ai_respond(ctx, prompt))
+    ai_tasks[ctx.author.id].add(task)
+
+    try:
+        async with ctx.typing():
+            await task
+
+    except asyncio.CancelledError:
+        # Our own command being cancelled (shutdown) must still propagate
+        if asyncio.current_task().cancelling():
+            raise
+        await ctx.reply("🛑 Request cancelled.")
+
+    except asyncio.TimeoutError:
+        await ctx.reply("⏳ The AI took too long to answer. Try again.")
+
+    except QueueFull:
+        await ctx.reply("🚦 The AI queue is full right now. Try again in a bit.")
+
+    except Exception as e:
+        await ctx.reply(f"Error: {e}")
+
+    finally:
+        tasks = ai_tasks[ctx.author.id]
+        tasks.discard(task)
+        if not tasks:
+            del ai_tasks[ctx.author.id]
+
+
+@bot.command(name="ai-cancel")
+async def ai_cancel(ctx):
+    tasks = [task for task in ai_tasks.get(ctx.author.id, ()) if not task.done()]
+
+    if not tasks:
+        await ctx.send("❌ You have no AI request running.")
+        return
+
+    for task in tasks:
+        task.cancel()
+
+
+@bot.command(name="ai-chat")
+async def ai_chat(ctx, mode: str = None):
+    if mode not in ("on", "off"):
+        state = "on" if ctx.channel.id in ai_chat_channels else "off"
+        return await ctx.send(f"💬 Conversation mode is **{state}** here. Use `!ai-chat on|off`.")
+
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not allowed to use this command.")
+
+    if mode == "on":
+        ai_chat_channels.add(ctx.channel.id)
+        await ctx.send("💬 Conversation mode on. `!ai` now remembers this channel's recent chat.")
+    else:
+        ai_chat_channels.discard(ctx.channel.id)
+        ai_memory.forget(ctx.channel.id)
+        await ctx.send("💬 Conversation mode off.")
+
+
+@bot.command(name="ai-forget")
+async def ai_forget(ctx):
+    ai_memory.forget(ctx.channel.id)
+    await ctx.send("🧹 Forgot this channel's AI conversation.")
+
+
+@bot.command(name="ai-queue")
+async def ai_queue(ctx):
+    await ctx.send(
+        f"🚦 **AI queue**\n"
+        f"Running: {ai_scheduler.running}/{ai_scheduler.slots}\n"
+        f"Waiting: {ai_scheduler.queued}/{ai_scheduler.max_queue}\n"
+        f"Rejected: {ai_scheduler.rejected}"
+    )
+
+
+@bot.command(name="ai-cache")
+async def ai_cache_cmd(ctx, action: str = None):
+    if action == "clear":
+        if ctx.author.id not in Admins:
+            return await ctx.send("❌ You are not allowed to use this command.")
+        ai_cache.clear()
+        return await ctx.send("🧹 AI cache cleared.")
+
+    total = ai_cache.hits + ai_cache.misses
+    rate = ai_cache.hits / total * 100 if total else 0
+    await ctx.send(
+        f"🧠 **AI cache**\n"
+        f"Entries: {len(ai_cache.entries)}/{ai_cache.max_entries} ({ai_cache.chars} chars)\n"
+        f"Hits: {ai_cache.hits} | Misses: {ai_cache.misses} | Hit rate: {rate:.0f}%\n"
+        f"Shared in-flight: {ai_cache.deduped}"
+    )
+
+DATA_FILE = "participants.json" 
+DB_FILE = os.getenv("DB_FILE", "bot.db")
+STORAGE_BACKEND = os.getenv("STORAGE", "sqlite")  # "sqlite" or "json" (single event)
+ALLOWED_CHANNEL_ID = 1488311639936598147
+
+TOURNAMENT_STATUSES = ("open", "running", "finished")
+ACTIVE_STATUSES = ("open", "running")
+
+
+class StorageError(Exception):
+    pass
+
+
+# ------------------ FILE HANDLING ------------------
+class JSONStorage(WriteBehind):
+    # Legacy single-event backend on participants.json. The file is read once;
+    # the dict keeps registration order and gives O(1) membership. Writes are
+    # coalesced and flushed in the background through a temp file + rename.
+    def __init__(self, path):
+        super().__init__(path)
+        data = self.read_json({})
+        self.ids = dict.fromkeys(data.get("participants", []))
+        self.matches = {(r, i): [players, winner] for r, i, players, winner in data.get("matches", [])}
+        self.lock = asyncio.Lock()
+
+    def _check(self, name):
+        if name not in (None, "default"):
+            raise StorageError("Multiple tournaments need the SQLite storage (`STORAGE=sqlite`).")
+
+    async def resolve(self, guild_id, name=None):
+        self._check(name)
+        return "default"
+
+    async def participants(self, guild_id, name=None):
+        self._check(name)
+        return list(self.ids)
+
+    async def load_matches(self, guild_id, name):
+        self._check(name)
+        return [(r, i, players, winner) for (r, i), (players, winner) in self.matches.items()]
+
+    async def save_matches(self, guild_id, name, rows, replace=False):
+        self._check(name)
+        if replace:
+            self.matches.clear()
+        for r, i, players, winner in rows:
+            self.matches[(r, i)] = [players, winner]
+        self._mark_dirty()
+
+    async def delete_matches(self, guild_id, name):
+        await self.save_matches(guild_id, name, [], replace=True)
+
+    async def tournaments(self, guild_id, status=None):
+        if status in (None, "open"):
+            return [("default", "open", len(self.ids))]
+        return []
+
+    async def user_tournaments(self, guild_id, user_id):
+        return [("default", "open")] if user_id in self.ids else []
+
+    async def create_tournament(self, guild_id, name):
+        self._check(name)
+
+    async def set_status(self, guild_id, name, status):
+        self._check(name)
+        raise StorageError("Tournament status needs the SQLite storage (`STORAGE=sqlite`).")
+
+    async def add(self, guild_id, user_id, name=None):
+        self._check(name)
+        async with self.lock:
+            if user_id in self.ids:
+                return False
+            self.ids[user_id] = None
+            self._mark_dirty()
+            return True
+
+    async def remove(self, guild_id, user_id, name=None):
+        self._check(name)
+        async with self.lock:
+            if user_id not in self.ids:
+                return False
+            del self.ids[user_id]
+            self._mark_dirty()
+            return True
+
+    def snapshot(self):
+        data = {"participants": list(self.ids)}
+        if self.matches:
+            data["matches"] = [[r, i, players, winner] for (r, i), (players, winner) in self.matches.items()]
+        return data
+
+
+TOURNAMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tournaments (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at REAL NOT NULL,
+    UNIQUE (guild_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_tournaments_status ON tournaments (guild_id, status, created_at);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    tournament_id INTEGER NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    registered_at REAL NOT NULL,
+    PRIMARY KEY (tournament_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_registrations_user ON registrations (user_id);
+
+CREATE TABLE IF NOT EXISTS matches (
+    tournament_id INTEGER NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+    round INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    players TEXT NOT NULL,
+    winner INTEGER,
+    PRIMARY KEY (tournament_id, round, idx)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStorage:
+    # Any number of tournaments per guild in SQLite (WAL). Every query runs on
+    # one dedicated thread, so the event loop never waits on the disk.
+    def __init__(self, path):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(TOURNAMENT_SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _resolve(self, guild_id, name, statuses):
+        # Named tournament, or the guild's newest one in one of `statuses`
+        if name:
+            row = self.db.execute(
+                "SELECT id, status FROM tournaments WHERE guild_id = ? AND name = ?",
+                (guild_id, name)
+            ).fetchone()
+            if not row:
+                raise StorageError(f"No tournament named **{name}**.")
+            if row[1] not in statuses:
+                raise StorageError(f"Tournament **{name}** is {row[1]}.")
+            return row[0]
+
+        marks = ", ".join("?" * len(statuses))
+        row = self.db.execute(
+            f"SELECT id FROM tournaments WHERE guild_id = ? AND status IN ({marks}) "
+            f"ORDER BY created_at DESC LIMIT 1",
+            (guild_id, *statuses)
+        ).fetchone()
+        if not row:
+            raise StorageError("No active tournament. An admin can start one with `!tournament-create <name>`.")
+        return row[0]
+
+    def _name(self, guild_id, name):
+        tournament_id = self._resolve(guild_id, name, TOURNAMENT_STATUSES if name else ACTIVE_STATUSES)
+        return self.db.execute("SELECT name FROM tournaments WHERE id = ?", (tournament_id,)).fetchone()[0]
+
+    def _load_matches(self, guild_id, name):
+        tournament_id = self._resolve(guild_id, name, TOURNAMENT_STATUSES)
+        rows = self.db.execute(
+            "SELECT round, idx, players, winner FROM matches WHERE tournament_id = ?",
+            (tournament_id,)
+        )
+        return [(r, i, json.loads(players), winner) for r, i, players, winner in rows]
+
+    def _save_matches(self, guild_id, name, rows, replace):
+        tournament_id = self._resolve(guild_id, name, TOURNAMENT_STATUSES)
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                self.db.execute("DELETE FROM matches WHERE tournament_id = ?", (tournament_id,))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?)",
+                [(tournament_id, r, i, json.dumps(players), winner) for r, i, players, winner in rows]
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _create(self, guild_id, name):
+        try:
+            self.db.execute(
+                "INSERT INTO tournaments (guild_id, name, created_at) VALUES (?, ?, ?)",
+                (guild_id, name, time.time())
+            )
+        except sqlite3.IntegrityError:
+            raise StorageError(f"Tournament **{name}** already exists.")
+
+    def _add(self, guild_id, user_id, name):
+        # First registration in a fresh guild starts the default event, as before
+        if name is None and not self.db.execute(
+            "SELECT 1 FROM tournaments WHERE guild_id = ?", (guild_id,)
+        ).fetchone():
+            self._create(guild_id, "default")
+
+        tournament_id = self._resolve(guild_id, name, ("open",))
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO registrations VALUES (?, ?, ?)",
+            (tournament_id, user_id, time.time())
+        )
+        return cur.rowcount == 1
+
+    def _remove(self, guild_id, user_id, name):
+        tournament_id = self._resolve(guild_id, name, ("open",))
+        cur = self.db.execute(
+            "DELETE FROM registrations WHERE tournament_id = ? AND user_id = ?",
+            (tournament_id, user_id)
+        )
+        return cur.rowcount == 1
+
+    def _participants(self, guild_id, name):
+        tournament_id = self._resolve(guild_id, name, TOURNAMENT_STATUSES if name else ACTIVE_STATUSES)
+        rows = self.db.execute(
+            "SELECT user_id FROM registrations WHERE tournament_id = ? ORDER BY registered_at",
+            (tournament_id,)
+        )
+        return [uid for (uid,) in rows]
+
+    def _tournaments(self, guild_id, status):
+        query = (
+            "SELECT t.name, t.status, COUNT(r.user_id) FROM tournaments t "
+            "LEFT JOIN registrations r ON r.tournament_id = t.id WHERE t.guild_id = ?"
+        )
+        args = [guild_id]
+        if status:
+            query += " AND t.status = ?"
+            args.append(status)
+        query += " GROUP BY t.id ORDER BY t.created_at DESC"
+        return self.db.execute(query, args).fetchall()
+
+    def _user_tournaments(self, guild_id, user_id):
+        return self.db.execute(
+            "SELECT t.name, t.status FROM registrations r JOIN tournaments t ON t.id = r.tournament_id "
+            "WHERE r.user_id = ? AND t.guild_id = ? ORDER BY t.created_at DESC",
+            (user_id, guild_id)
+        ).fetchall()
+
+    def _set_status(self, guild_id, name, status):
+        cur = self.db.execute(
+            "UPDATE tournaments SET status = ? WHERE guild_id = ? AND name = ?",
+            (status, guild_id, name)
+        )
+        if cur.rowcount == 0:
+            raise StorageError(f"No tournament named **{name}**.")
 
+    def _import_json(self, path, guild_id, name):
+        with open(path, "r") as f:
+            ids = json.load(f).get("participants", [])
 
-    # =========================
-    # 3️⃣ Word Triggers (ONLY in specific channel)
-    # =========================
-    if message.channel.id == MUSIC_CHANNEL_ID:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(
+                "INSERT OR IGNORE INTO tournaments (guild_id, name, created_at) VALUES (?, ?, ?)",
+                (guild_id, name, time.time())
+            )
+            tournament_id = self._resolve(guild_id, name, TOURNAMENT_STATUSES)
+            now = time.time()
+            # Offset timestamps so the original registration order is kept
+            self.db.executemany(
+                "INSERT OR IGNORE INTO registrations VALUES (?, ?, ?)",
+                [(tournament_id, uid, now + i * 1e-6) for i, uid in enumerate(ids)]
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
 
-        content = message.content.lower().strip()
+        os.replace(path, f"{path}.migrated")
+        return len(ids)
 
-        if content in ["f", "ff", "w", "uff"]:
+    async def add(self, guild_id, user_id, name=None):
+        return await self._run(self._add, guild_id, user_id, name)
 
-            user_id = message.author.id
-            now = time.time()
+    async def remove(self, guild_id, user_id, name=None):
+        return await self._run(self._remove, guild_id, user_id, name)
 
-            # Store message timestamps
-            spam_tracker[user_id].append(now)
-
-            # Remove timestamps older than 5 sec
-            spam_tracker[user_id] = [
-                t for t in spam_tracker[user_id] if now - t < SPAM_WINDOW
-            ]
-
-            # If spam detected
-            if len(spam_tracker[user_id]) > SPAM_LIMIT:
-
-                messages = []
-
-                async for msg in message.channel.history(limit=20):
-                    if msg.author == message.author and msg.content.lower().strip() == content:
-                        messages.append(msg)
-
-                # delete extra messages (keep first 5)
-                for msg in messages[KEEP_MESSAGES:]:
-                    try:
-                        await msg.delete()
-                    except:
-                        pass
-
-            # F = nice
-            if content == "f":
-                response = random.choice(F_RESPONSES)
-                await message.channel.send(response.format(user=message.author.mention))
-
-            # FF = very nice
-            elif content == "ff":
-                response = random.choice(FF_RESPONSES)
-                await message.channel.send(response.format(user=message.author.mention))
-
-            # INSANELY GOOD
-            elif content == "w":
-                response = random.choice(W_RESPONSES)
-                await message.channel.send(response.format(user=message.author.mention))
-            
-            # UFF reaction
-            elif content == "uff":
-                embed = discord.Embed(color=0xff0000)
-                embed.set_image(url="https://static.klipy.com/ii/35ccce3d852f7995dd2da910f2abd795/25/03/7fBW7jWy.gif")
-
-                await message.channel.send(
-                    f"🎧 {message.author.mention} after hearing those vocals!",
-                    embed=embed
-                )
-    await bot.process_commands(message)
+    async def resolve(self, guild_id, name=None):
+        return await self._run(self._name, guild_id, name)
 
-GEMINI_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_KEY)
+    async def participants(self, guild_id, name=None):
+        return await self._run(self._participants, guild_id, name)
 
-model = genai.GenerativeModel("gemini-2.5-flash")
+    async def load_matches(self, guild_id, name):
+        return await self._run(self._load_matches, guild_id, name)
 
-@bot.command()
-async def ai(ctx, *, prompt):
-    await ctx.typing()
+    async def save_matches(self, guild_id, name, rows, replace=False):
+        return await self._run(self._save_matches, guild_id, name, rows, replace)
 
-    try:
-        response = model.generate_content(prompt)
-        text = response.text
+    async def delete_matches(self, guild_id, name):
+        return await self._run(self._save_matches, guild_id, name, [], True)
 
-        # Discord message limit
-        if len(text) > 2000:
-            text = text[:1990] + "..."
+    async def tournaments(self, guild_id, status=None):
+        return await self._run(self._tournaments, guild_id, status)
 
-        await ctx.reply(text)
+    async def user_tournaments(self, guild_id, user_id):
+        return await self._run(self._user_tournaments, guild_id, user_id)
 
-    except Exception as e:
-        await ctx.reply(f"Error: {e}")
+    async def create_tournament(self, guild_id, name):
+        return await self._run(self._create, guild_id, name)
 
-DATA_FILE = "participants.json" 
-ALLOWED_CHANNEL_ID = 1488311639936598147
-# ------------------ FILE HANDLING ------------------
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"teams": []}
+    async def set_status(self, guild_id, name, status):
+        return await self._run(self._set_status, guild_id, name, status)
 
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        # File is empty or broken → reset it
-        data = {"teams": []}
-        save_data(data)
-        return data
+    async def import_json(self, path, guild_id, name="default"):
+        return await self._run(self._import_json, path, guild_id, name)
 
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+
+if STORAGE_BACKEND == "json":
+    storage = JSONStorage(DATA_FILE)
+else:
+    storage = SQLiteStorage(DB_FILE)
 
 
 def is_allowed_channel(ctx):
@@ -831,10 +3363,10 @@ def success_embed(team_name, members):
 # ------------------ COMMAND ------------------
 # ------------------ COMMAND ------------------
 @bot.command()
-async def register(ctx, player: discord.Member):
+async def register(ctx, player: discord.Member, tournament: str = None):
     """
-    Register a single participant in participants.json
-    Usage: !register @player
+    Register a single participant in the active (or named) tournament
+    Usage: !register @player [tournament]
     """
 
     # Channel check
@@ -842,17 +3374,17 @@ async def register(ctx, player: discord.Member):
         await ctx.send("❌ You can only register in the designated channel.")
         return
 
-    data = load_data()  # loads {"participants": [...]}
+    # Add the player (False if already registered)
+    try:
+        added = await storage.add(ctx.guild.id, player.id, tournament)
+    except StorageError as e:
+        await ctx.send(f"❌ {e}")
+        return
 
-    # Check if player is already registered
-    if player.id in data.get("participants", []):
+    if not added:
         await ctx.send(f"❌ {player.mention} is already registered!")
         return
 
-    # Add the player
-    data.setdefault("participants", []).append(player.id)
-    save_data(data)
-
     # Send confirmation embed
     embed = discord.Embed(
         title="✅ Registered Successfully!",
@@ -877,142 +3409,509 @@ async def register_error(ctx, error):
         await ctx.send("⚠️ Something went wrong.")
         print(error)
 
-    # ------------------ VIEW TEAMS ------------------
+    # ------------------ PAGINATED LISTS ------------------
+LIST_PAGE_SIZE = 20
+
+name_cache = {}  # (guild id, user id) -> name, dropped on member/user updates
+
+
+def member_name(guild, uid):
+    name = name_cache.get((guild.id, uid))
+    if name is None:
+        member = guild.get_member(uid)
+        if not member:
+            return f"Unknown User ({uid})"
+        name = name_cache[(guild.id, uid)] = member.name
+    return name
+
+
+@bot.event
+async def on_member_update(before, after):
+    name_cache.pop((after.guild.id, after.id), None)
+
+
+@bot.event
+async def on_member_remove(member):
+    name_cache.pop((member.guild.id, member.id), None)
+
+
+@bot.event
+async def on_user_update(before, after):
+    for g in after.mutual_guilds:
+        name_cache.pop((g.id, after.id), None)
+
+
+# kind -> (title, async fetch(guild, key) -> list of user ids)
+PAGED_SOURCES = {}
+
+
+def paged_source(kind, title):
+    def decorator(fetch):
+        PAGED_SOURCES[kind] = (title, fetch)
+        return fetch
+    return decorator
+
+
+@paged_source("participants", "📋 Registered Participants")
+async def participants_source(guild, key):
+    return await storage.participants(guild.id, key)
+
+
+async def render_paged_list(guild, kind, key, page):
+    # Only names on the requested page are resolved; returns (None, None) if empty
+    title, fetch = PAGED_SOURCES[kind]
+    ids = await fetch(guild, key)
+    if not ids:
+        return None, None
+
+    pages = math.ceil(len(ids) / LIST_PAGE_SIZE)
+    page = max(0, min(page, pages - 1))
+    start = page * LIST_PAGE_SIZE
+
+    embed = discord.Embed(
+        title=f"{title} (Page {page + 1}/{pages})",
+        description="\n".join(
+            f"{i + 1}. {member_name(guild, uid)}"
+            for i, uid in enumerate(ids[start:start + LIST_PAGE_SIZE], start=start)
+        ),
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text=f"{key} • {len(ids)} total")
+
+    view = View(timeout=None)
+    for action in PagedListButton.LABELS:
+        view.add_item(PagedListButton(kind, key, page, action, disabled=(
+            (action == "prev" and page == 0) or (action == "next" and page == pages - 1)
+        )))
+    return embed, view
+
+
+class PagedListButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"plist:(?P<kind>\w+):(?P<page>\d+):(?P<action>\w+):(?P<key>.*)"
+):
+    # All state lives in the custom_id, so buttons keep working after a restart
+    LABELS = {"prev": "⬅️ Previous", "next": "➡️ Next", "jump": "🔢 Page", "search": "🔍 Search"}
+
+    def __init__(self, kind, key, page, action, disabled=False):
+        super().__init__(discord.ui.Button(
+            label=self.LABELS[action],
+            style=discord.ButtonStyle.gray,
+            custom_id=f"plist:{kind}:{page}:{action}:{key}",
+            disabled=disabled
+        ))
+        self.kind = kind
+        self.key = key
+        self.page = page
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["kind"], match["key"], int(match["page"]), match["action"])
+
+    async def callback(self, interaction):
+        if self.action == "jump":
+            return await interaction.response.send_modal(JumpToPageModal(self.kind, self.key))
+        if self.action == "search":
+            return await interaction.response.send_modal(ListSearchModal(self.kind, self.key))
+
+        page = self.page - 1 if self.action == "prev" else self.page + 1
+        await show_paged_list_page(interaction, self.kind, self.key, page)
+
+
+async def show_paged_list_page(interaction, kind, key, page):
+    try:
+        embed, view = await render_paged_list(interaction.guild, kind, key, page)
+    except StorageError as e:
+        return await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+
+    if embed is None:
+        return await interaction.response.send_message("The list is empty now.", ephemeral=True)
+    await interaction.response.edit_message(embed=embed, view=view)
+
+
+class JumpToPageModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page number", max_length=6)
+
+    def __init__(self, kind, key):
+        super().__init__()
+        self.kind = kind
+        self.key = key
+
+    async def on_submit(self, interaction):
+        if not self.page.value.isdigit():
+            return await interaction.response.send_message("❌ Enter a page number.", ephemeral=True)
+        await show_paged_list_page(interaction, self.kind, self.key, int(self.page.value) - 1)
+
+
+class ListSearchModal(discord.ui.Modal, title="Search"):
+    query = discord.ui.TextInput(label="Name contains", max_length=32)
+
+    def __init__(self, kind, key):
+        super().__init__()
+        self.kind = kind
+        self.key = key
+
+    async def on_submit(self, interaction):
+        _, fetch = PAGED_SOURCES[self.kind]
+        try:
+            ids = await fetch(interaction.guild, self.key)
+        except StorageError as e:
+            return await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+
+        query = self.query.value.casefold()
+        hits = []
+        for i, uid in enumerate(ids):
+            name = member_name(interaction.guild, uid)
+            if query in name.casefold():
+                hits.append(f"{i + 1}. {name} (page {i // LIST_PAGE_SIZE + 1})")
+
+        if not hits:
+            return await interaction.response.send_message("No matches.", ephemeral=True)
+
+        more = f"\n…and {len(hits) - 20} more" if len(hits) > 20 else ""
+        await interaction.response.send_message("\n".join(hits[:20]) + more, ephemeral=True)
+
+
+bot.add_dynamic_items(PagedListButton)
+
+
 # ------------------ VIEW TEAMS ------------------
 @bot.command()
-async def participants(ctx):
+async def participants(ctx, tournament: str = None):
     if not is_allowed_channel(ctx):
         return
 
-    data = load_data()
-    participant_ids = data.get("participants", [])
+    try:
+        name = await storage.resolve(ctx.guild.id, tournament)
+        embed, view = await render_paged_list(ctx.guild, "participants", name, 0)
+    except StorageError as e:
+        await ctx.send(f"❌ {e}")
+        return
 
-    if not participant_ids:
+    if embed is None:
         await ctx.send("No participants registered yet.")
         return
 
-    # Resolve IDs to member names
-    members = []
-    for uid in participant_ids:
-        member = ctx.guild.get_member(uid)
-        if member:
-            members.append(member.name)
-        else:
-            members.append(f"Unknown User ({uid})")
-
-    # Pagination settings
-    page_size = 20
-    total_pages = math.ceil(len(members) / page_size)
-    current_page = 1
+    await ctx.send(embed=embed, view=view)
 
-    def get_page_content(page):
-        start = (page - 1) * page_size
-        end = start + page_size
-        page_members = members[start:end]
-        return "\n".join([f"{i+1}. {name}" for i, name in enumerate(page_members, start=start)])
+Admins = [1139607940232384524, 1462248580793241623, 1257369692730036466]
+# ------------------ LUDO MATCH ------------------
+LUDO_MATCH_SIZE = 4
+BRACKET_PAGE_SIZE = 10  # matches per page
+
+
+class BracketError(Exception):
+    pass
+
+
+class Bracket:
+    # Knockout bracket: up to 4 players per match, the winner advances.
+    # Match (r, i) feeds match (r + 1, i % len(round r + 1)), so players are
+    # dealt evenly into every round instead of leaving a waiting list.
+    def __init__(self, rounds):
+        self.rounds = rounds    # rounds[r][i] = [player ids, winner id or None]
+        self.position = {}      # user id -> (round, index) of their latest match
+        for r, matches in enumerate(rounds):
+            for i, (players, _) in enumerate(matches):
+                for uid in players:
+                    self.position[uid] = (r, i)
+
+    @classmethod
+    def build(cls, player_ids):
+        # Round sizes shrink by 4x until a single final is left
+        sizes = []
+        n = len(player_ids)
+        while True:
+            n = math.ceil(n / LUDO_MATCH_SIZE)
+            sizes.append(n)
+            if n == 1:
+                break
+
+        rounds = [[[[], None] for _ in range(size)] for size in sizes]
+
+        # Dealing round-robin spreads the first (seeded) players over different matches
+        for j, uid in enumerate(player_ids):
+            rounds[0][j % sizes[0]][0].append(uid)
+
+        bracket = cls(rounds)
+        for i, (players, _) in enumerate(rounds[0]):
+            if len(players) == 1:
+                bracket._advance(0, i, players[0])  # bye
+        return bracket
+
+    @classmethod
+    def from_rows(cls, rows):
+        rounds = []
+        for r, i, players, winner in sorted(rows, key=lambda row: (row[0], row[1])):
+            while len(rounds) <= r:
+                rounds.append([])
+            rounds[r].append([players, winner])
+        return cls(rounds)
+
+    def keys(self):
+        return [(r, i) for r, matches in enumerate(self.rounds) for i in range(len(matches))]
+
+    def rows(self, keys):
+        return [(r, i, *self.rounds[r][i]) for r, i in keys]
+
+    @property
+    def champion(self):
+        return self.rounds[-1][0][1]
+
+    @property
+    def total_matches(self):
+        return sum(len(matches) for matches in self.rounds)
+
+    def expected(self, r, i):
+        # Number of players the match will have once every feeder has finished
+        if r == 0:
+            return len(self.rounds[0][i][0])
+        return len(range(i, len(self.rounds[r - 1]), len(self.rounds[r])))
+
+    def record(self, uid):
+        """Record uid as winner of their current match; returns changed match keys."""
+        if uid not in self.position:
+            raise BracketError("This player is not in the bracket.")
+
+        r, i = self.position[uid]
+        players, winner = self.rounds[r][i]
+
+        if winner == uid:
+            raise BracketError("This player is already the champion.")
+        if winner is not None:
+            raise BracketError("This player has been knocked out.")
+        if len(players) < self.expected(r, i):
+            raise BracketError("This match is still waiting for other results.")
+
+        return self._advance(r, i, uid)
+
+    def _advance(self, r, i, uid):
+        self.rounds[r][i][1] = uid
+        changed = [(r, i)]
+
+        if r + 1 < len(self.rounds):
+            k = i % len(self.rounds[r + 1])
+            self.rounds[r + 1][k][0].append(uid)
+            self.position[uid] = (r + 1, k)
+            changed.append((r + 1, k))
+
+        return changed
+
+    def page(self, page):
+        # Only the matches on the requested page are located and rendered
+        start = page * BRACKET_PAGE_SIZE
+        end = start + BRACKET_PAGE_SIZE
+        offset = 0
+
+        for r, matches in enumerate(self.rounds):
+            if offset + len(matches) > start:
+                for i in range(max(0, start - offset), len(matches)):
+                    if offset + i >= end:
+                        return
+                    yield r, i
+            offset += len(matches)
+
+
+brackets = {}  # (guild id, tournament) -> Bracket
+
+
+async def get_bracket(guild_id, name):
+    key = (guild_id, name)
+    if key not in brackets:
+        rows = await storage.load_matches(guild_id, name)
+        if not rows:
+            return None
+        brackets[key] = Bracket.from_rows(rows)
+    return brackets[key]
+
+
+def bracket_embed(bracket, name, guild, page):
+    pages = math.ceil(bracket.total_matches / BRACKET_PAGE_SIZE)
+    description = "4 players per match. Winner advances."
+    if bracket.champion:
+        description += f"\n🏆 Champion: **{member_name(guild, bracket.champion)}**"
 
-    # Create initial embed
     embed = discord.Embed(
-        title=f"📋 Registered Participants (Page {current_page}/{total_pages})",
-        description=get_page_content(current_page),
-        color=discord.Color.blue()
+        title=f"🎲 Ludo Bracket — {name} (Page {page + 1}/{pages})",
+        description=description,
+        color=discord.Color.gold()
     )
 
-    # Buttons for pagination
-    class Paginator(View):
-        def __init__(self):
-            super().__init__(timeout=120)  # 2 minutes timeout
-            self.current_page = 1
-
-        @discord.ui.button(label="⬅️ Previous", style=discord.ButtonStyle.gray)
-        async def prev(self, interaction, button):
-            if self.current_page > 1:
-                self.current_page -= 1
-                embed.description = get_page_content(self.current_page)
-                embed.title = f"📋 Registered Participants (Page {self.current_page}/{total_pages})"
-                await interaction.response.edit_message(embed=embed, view=self)
-
-        @discord.ui.button(label="➡️ Next", style=discord.ButtonStyle.gray)
-        async def next(self, interaction, button):
-            if self.current_page < total_pages:
-                self.current_page += 1
-                embed.description = get_page_content(self.current_page)
-                embed.title = f"📋 Registered Participants (Page {self.current_page}/{total_pages})"
-                await interaction.response.edit_message(embed=embed, view=self)
-
-    await ctx.send(embed=embed, view=Paginator())
-    
-Admins = [1139607940232384524, 1462248580793241623, 1257369692730036466]
-# ------------------ LUDO MATCH ------------------
+    last_round = len(bracket.rounds) - 1
+    for r, i in bracket.page(page):
+        players, winner = bracket.rounds[r][i]
+        lines = []
+        for uid in players:
+            if winner == uid:
+                lines.append(f"🏆 **{member_name(guild, uid)}**")
+            elif winner:
+                lines.append(f"~~{member_name(guild, uid)}~~")
+            else:
+                lines.append(f"• {member_name(guild, uid)}")
+        lines.extend(["⏳ TBD"] * (bracket.expected(r, i) - len(players)))
+        if r == 0 and len(players) == 1:
+            lines.append("(bye)")
+
+        title = "🏁 Final" if r == last_round else f"🎮 Round {r + 1} • Match {i + 1}"
+        embed.add_field(name=title, value="\n".join(lines), inline=False)
+
+    return embed
+
+
+class BracketView(View):
+    def __init__(self, bracket, name, guild):
+        super().__init__(timeout=120)
+        self.bracket = bracket
+        self.name = name
+        self.guild = guild
+        self.page = 0
+        self.pages = math.ceil(bracket.total_matches / BRACKET_PAGE_SIZE)
+
+    def render(self):
+        return bracket_embed(self.bracket, self.name, self.guild, self.page)
+
+    @discord.ui.button(label="⬅️ Previous", style=discord.ButtonStyle.gray)
+    async def prev(self, interaction, button):
+        if self.page > 0:
+            self.page -= 1
+            await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="➡️ Next", style=discord.ButtonStyle.gray)
+    async def next(self, interaction, button):
+        if self.page < self.pages - 1:
+            self.page += 1
+            await interaction.response.edit_message(embed=self.render(), view=self)
+
+
+MEMBER_MENTION = re.compile(r"<@!?(\d+)>|(\d{15,20})")
+
+
 @bot.command()
-async def ludomatch(ctx):
+async def ludomatch(ctx, tournament: str = None, *seeds: discord.Member):
+    """
+    Build the bracket for the tournament (or show it if it already exists)
+    Usage: !ludomatch [tournament] [@seed1 @seed2 ...]
+    """
     if not is_allowed_channel(ctx):
         return
     if ctx.author.id not in Admins:
         await ctx.send("❌ You are not authorized to run this command.")
         return
 
-    data = load_data()
-    participant_ids = data.get("participants", [])
+    # `!ludomatch @a @b`: the first mention is a seed, not a tournament name
+    if tournament:
+        found = MEMBER_MENTION.fullmatch(tournament)
+        member = ctx.guild.get_member(int(found.group(1) or found.group(2))) if found else None
+        if member:
+            seeds = (member,) + seeds
+            tournament = None
 
-    if not participant_ids:
-        await ctx.send("No participants registered yet.")
+    try:
+        name = await storage.resolve(ctx.guild.id, tournament)
+        bracket = await get_bracket(ctx.guild.id, name)
+
+        if bracket is None:
+            participant_ids = await storage.participants(ctx.guild.id, name)
+
+            if not participant_ids:
+                await ctx.send("No participants registered yet.")
+                return
+
+            # Seeds first in the given order, everyone else shuffled behind them
+            registered = set(participant_ids)
+            seeded = list(dict.fromkeys(m.id for m in seeds if m.id in registered))
+            others = [uid for uid in participant_ids if uid not in set(seeded)]
+            random.shuffle(others)
+
+            bracket = Bracket.build(seeded + others)
+            await storage.save_matches(ctx.guild.id, name, bracket.rows(bracket.keys()), replace=True)
+            brackets[(ctx.guild.id, name)] = bracket
+
+            try:
+                await storage.set_status(ctx.guild.id, name, "running")
+            except StorageError:
+                pass
+
+    except StorageError as e:
+        await ctx.send(f"❌ {e}")
         return
 
-    # Flatten all members
-    participants_list = []
-    for uid in participant_ids:
-        member = ctx.guild.get_member(uid)
-        if member:
-            participants_list.append(member.name)
-        else:
-            participants_list.append(f"Unknown User ({uid})")
+    view = BracketView(bracket, name, ctx.guild)
+    await ctx.send(embed=view.render(), view=view)
 
-    random.shuffle(participants_list)
 
-    matches = []
-    waiting = []
+@bot.command(name="ludo-bracket")
+async def ludo_bracket(ctx, tournament: str = None):
+    if not is_allowed_channel(ctx):
+        return
 
-    # Groups of 4 players
-    for i in range(0, len(participants_list), 4):
-        group = participants_list[i:i+4]
-        if len(group) == 4:
-            matches.append(group)
-        else:
-            waiting.extend(group)
+    try:
+        name = await storage.resolve(ctx.guild.id, tournament)
+        bracket = await get_bracket(ctx.guild.id, name)
+    except StorageError as e:
+        return await ctx.send(f"❌ {e}")
 
-    # Send matches in embeds (split if >25 fields)
-    embed = discord.Embed(
-        title="🎲 Ludo Matchmaking",
-        description="4 players per match. Winner advances.",
-        color=discord.Color.gold()
-    )
-    field_count = 0
-
-    for idx, match in enumerate(matches, start=1):
-        players = "\n".join([f"• {p}" for p in match])
-        embed.add_field(name=f"🎮 Match {idx}", value=players, inline=False)
-        field_count += 1
-
-        if field_count == 25:  # max 25 fields per embed
-            await ctx.send(embed=embed)
-            embed = discord.Embed(color=discord.Color.gold())
-            field_count = 0
-
-    # Add remaining embed fields (if any) and waiting list
-    if waiting or field_count > 0:
-        if waiting:
-            wait_list = ", ".join([f"{p}" for p in waiting])
-            embed.add_field(name="🪑 Waiting List", value=wait_list, inline=False)
-        await ctx.send(embed=embed)
+    if bracket is None:
+        return await ctx.send("❌ No bracket yet. An admin can create one with `!ludomatch`.")
 
-@bot.command()
-async def unregister(ctx, member: discord.Member = None):
+    view = BracketView(bracket, name, ctx.guild)
+    await ctx.send(embed=view.render(), view=view)
+
+
+@bot.command(name="ludo-result")
+async def ludo_result(ctx, winner: discord.Member, tournament: str = None):
+    if not is_allowed_channel(ctx):
+        return
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not authorized to run this command.")
+
+    try:
+        name = await storage.resolve(ctx.guild.id, tournament)
+        bracket = await get_bracket(ctx.guild.id, name)
+        if bracket is None:
+            return await ctx.send("❌ No bracket yet. Create one with `!ludomatch`.")
 
+        changed = bracket.record(winner.id)
+        await storage.save_matches(ctx.guild.id, name, bracket.rows(changed))
+
+        if bracket.champion:
+            try:
+                await storage.set_status(ctx.guild.id, name, "finished")
+            except StorageError:
+                pass
+
+    except (StorageError, BracketError) as e:
+        return await ctx.send(f"❌ {e}")
+
+    if bracket.champion:
+        await ctx.send(f"🏆 {winner.mention} wins **{name}**!")
+    else:
+        r, i = bracket.position[winner.id]
+        await ctx.send(f"✅ {winner.mention} advances to Round {r + 1} • Match {i + 1}.")
+
+
+@bot.command(name="ludo-reset")
+async def ludo_reset(ctx, tournament: str = None):
     if not is_allowed_channel(ctx):
         return
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not authorized to run this command.")
+
+    try:
+        name = await storage.resolve(ctx.guild.id, tournament)
+        await storage.delete_matches(ctx.guild.id, name)
+    except StorageError as e:
+        return await ctx.send(f"❌ {e}")
+
+    brackets.pop((ctx.guild.id, name), None)
+    await ctx.send(f"🗑️ Bracket for **{name}** cleared.")
 
-    data = load_data()
+@bot.command()
+async def unregister(ctx, member: discord.Member = None, tournament: str = None):
+
+    if not is_allowed_channel(ctx):
+        return
 
     # If no member mentioned → unregister yourself
     if member is None:
@@ -1021,42 +3920,343 @@ async def unregister(ctx, member: discord.Member = None):
     if member != ctx.author and not ctx.author.id in Admins:
         await ctx.send("❌ You can only unregister yourself.")
         return
-    # Check if user exists
-    found = False
-    if member.id in data.get("participants", []):
-        data["participants"].remove(member.id)
-        found = True
+    # Remove the user (False if not registered)
+    try:
+        removed = await storage.remove(ctx.guild.id, member.id, tournament)
+    except StorageError as e:
+        await ctx.send(f"❌ {e}")
+        return
 
-    if not found:
+    if not removed:
         await ctx.send(f"❌ {member.mention} is not registered.")
         return
 
-    save_data(data)
-
     await ctx.send(f"🗑️ {member.mention} has been unregistered.")
 
+
+# ------------------ TOURNAMENTS ------------------
+@bot.command(name="tournament-create")
+async def tournament_create(ctx, *, name: str):
+    if not is_allowed_channel(ctx):
+        return
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not authorized to run this command.")
+    if len(name) > 50:
+        return await ctx.send("❌ Tournament name is too long (max 50).")
+
+    try:
+        await storage.create_tournament(ctx.guild.id, name)
+    except StorageError as e:
+        return await ctx.send(f"❌ {e}")
+
+    await ctx.send(f"🏆 Tournament **{name}** created. Registrations are open!")
+
+
+@bot.command(name="tournament-status")
+async def tournament_status(ctx, name: str, status: str):
+    if not is_allowed_channel(ctx):
+        return
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not authorized to run this command.")
+    if status not in TOURNAMENT_STATUSES:
+        return await ctx.send(f"❌ Status must be one of: {', '.join(TOURNAMENT_STATUSES)}")
+
+    try:
+        await storage.set_status(ctx.guild.id, name, status)
+    except StorageError as e:
+        return await ctx.send(f"❌ {e}")
+
+    await ctx.send(f"✅ Tournament **{name}** is now **{status}**.")
+
+
+@bot.command(name="tournament-import")
+async def tournament_import(ctx, *, name: str = "default"):
+    if ctx.author.id not in Admins:
+        return await ctx.send("❌ You are not authorized to run this command.")
+    if not isinstance(storage, SQLiteStorage):
+        return await ctx.send("❌ Import needs the SQLite storage (`STORAGE=sqlite`).")
+    if not os.path.exists(DATA_FILE):
+        return await ctx.send(f"❌ `{DATA_FILE}` not found (already migrated?).")
+
+    count = await storage.import_json(DATA_FILE, ctx.guild.id, name)
+    await ctx.send(f"✅ Imported {count} participants into **{name}**.")
+
+
+@bot.command()
+async def tournaments(ctx, status: str = None):
+    if not is_allowed_channel(ctx):
+        return
+
+    rows = await storage.tournaments(ctx.guild.id, status)
+    if not rows:
+        return await ctx.send("No tournaments found.")
+
+    lines = [f"• **{name}** — {state} ({count} players)" for name, state, count in rows[:25]]
+    embed = discord.Embed(title="🏆 Tournaments", description="\n".join(lines), color=discord.Color.gold())
+    await ctx.send(embed=embed)
+
+
+@bot.command(name="my-tournaments")
+async def my_tournaments(ctx):
+    if not is_allowed_channel(ctx):
+        return
+
+    rows = await storage.user_tournaments(ctx.guild.id, ctx.author.id)
+    if not rows:
+        return await ctx.send("You are not registered in any tournament.")
+
+    await ctx.send("🎟️ Your tournaments: " + ", ".join(f"**{name}** ({state})" for name, state in rows))
+
 Game_Admins = [1441514997938126930, 1419263240571191439]
 import time
 
 ROLE_ID = 1489373485896564946  # 🔁 replace with your role ID
 COOLDOWN = 7200  # 2 hours in seconds
 
-last_used = 0
+# =========================
+# Cooldowns
+# =========================
+COOLDOWN_FILE = "cooldowns.json"
+COOLDOWN_SCOPES = ("user", "channel", "guild", "global")
+
+
+class CooldownStore(WriteBehind):
+    """
+    Token buckets for command cooldowns, keyed "command:scope:id". Tokens
+    are recomputed from elapsed time when touched (no timers), full buckets
+    carry no state and are evicted, and buckets refilling slower than
+    PERSIST_MIN seconds per use are saved so long cooldowns survive a
+    restart. The clock is wall time so saved buckets stay meaningful.
+    """
+    MAX_BUCKETS = 10_000
+    PERSIST_MIN = 60  # seconds per use
+
+    def __init__(self, path, clock=time.time):
+        super().__init__(path)
+        self.clock = clock
+        self.buckets = {}
+
+        for key, (rate, capacity, tokens, updated) in self.read_json({}).items():
+            bucket = self.buckets[key] = TokenBucket(rate, capacity, updated)
+            bucket.tokens = tokens
+        self.evict()
+
+    @staticmethod
+    def key(name, scope, ctx):
+        if scope == "user":
+            ident = ctx.author.id
+        elif scope == "channel":
+            ident = ctx.channel.id
+        elif scope == "guild":
+            ident = ctx.guild.id if ctx.guild else f"dm{ctx.channel.id}"
+        else:
+            ident = "*"
+        return f"{name}:{scope}:{ident}"
+
+    def peek(self, key):
+        """Seconds until `key` has a use available, without spending it."""
+        bucket = self.buckets.get(key)
+        return bucket.retry_after(self.clock()) if bucket else 0
+
+    def take(self, key, uses, per):
+        """Spend one use. Returns 0, or the seconds until a use is available."""
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                self.evict()
+            bucket = self.buckets[key] = TokenBucket(uses / per, uses, now)
+        else:
+            bucket.rate, bucket.capacity = uses / per, uses  # follow config changes
+
+        wait = bucket.retry_after(now)
+        if wait:
+            return wait
+
+        bucket.tokens -= 1
+        if per / uses >= self.PERSIST_MIN:
+            self._mark_dirty()
+        return 0
+
+    def refund(self, key):
+        """Give back a use spent by a command that exited without doing anything."""
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket.refill(self.clock())
+            bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+            self._mark_dirty()
+
+    def evict(self):
+        now = self.clock()
+        for key in [k for k, b in self.buckets.items() if b.retry_after(now, b.capacity) == 0]:
+            del self.buckets[key]
+
+    def snapshot(self):
+        self.evict()
+        return {
+            key: [b.rate, b.capacity, b.tokens, b.updated]
+            for key, b in self.buckets.items()
+            if 1 / b.rate >= self.PERSIST_MIN
+        }
+
+
+cooldowns = CooldownStore(COOLDOWN_FILE)
+
+
+def format_wait(seconds):
+    seconds = math.ceil(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    if seconds >= 60:
+        return f"{math.ceil(seconds / 60)} minutes"
+    return f"{seconds} seconds"
+
+
+class CooldownActive(commands.CheckFailure):
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class NotAllowed(commands.CheckFailure):
+    pass
+
+
+def cooldown(uses, per, scope="user"):
+    # `uses` invocations per `per` seconds for each user/channel/guild, or
+    # globally. The check only reads the bucket (!help runs checks too); the
+    # use is spent in a before-invoke hook, after checks and argument parsing.
+    if scope not in COOLDOWN_SCOPES:
+        raise ValueError(f"unknown cooldown scope {scope!r}")
+
+    async def predicate(ctx):
+        wait = cooldowns.peek(CooldownStore.key(ctx.command.qualified_name, scope, ctx))
+        if wait:
+            raise CooldownActive(wait)
+        return True
+
+    def decorator(func):
+        func.__cooldowns__ = getattr(func, "__cooldowns__", []) + [(uses, per, scope)]
+        func.__before_invoke__ = spend_cooldowns
+        return commands.check(predicate)(func)
+    return decorator
+
+
+async def spend_cooldowns(ctx):
+    ctx.cooldown_keys = []
+    for uses, per, scope in ctx.command.callback.__cooldowns__:
+        key = CooldownStore.key(ctx.command.qualified_name, scope, ctx)
+        wait = cooldowns.take(key, uses, per)
+        if wait:
+            refund_cooldown(ctx)  # another invocation got there first
+            raise CooldownActive(wait)
+        ctx.cooldown_keys.append(key)
+
+
+def refund_cooldown(ctx):
+    # Call on an early exit so a failed invocation doesn't cost a use
+    for key in getattr(ctx, "cooldown_keys", ()):
+        cooldowns.refund(key)
+
+
+def is_admin():
+    async def predicate(ctx):
+        if ctx.author.id not in Admins:
+            raise NotAllowed()  # replied to in Bot.on_command_error, silent for !help
+        return True
+    return commands.check(predicate)
+
+
+# =========================
+# Bulk Operations
+# =========================
+BULK_CONCURRENCY = 5          # requests in flight; discord.py queues per route bucket
+BULK_COMPLETED = ("success", "skipped")  # labels saved to a checkpoint; others are retried on resume
+BULK_PROGRESS_INTERVAL = 3    # seconds between status message edits
+BULK_CHECKPOINT_FILE = "bulk_checkpoint.json"
+
+
+def load_bulk_checkpoints():
+    if not os.path.exists(BULK_CHECKPOINT_FILE):
+        return {}
+    try:
+        with open(BULK_CHECKPOINT_FILE, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+bulk_checkpoints = load_bulk_checkpoints()  # run key -> items already done
+
+
+async def save_bulk_checkpoints():
+    data = json.dumps(bulk_checkpoints)
+    await asyncio.to_thread(write_file_atomic, BULK_CHECKPOINT_FILE, data)
+
+
+async def run_bulk(items, action, concurrency=BULK_CONCURRENCY, on_progress=None, checkpoint=None,
+                   completed=BULK_COMPLETED):
+    """
+    Run `action(item)` for every item with at most `concurrency` in flight.
+    `action` returns a result label and the labels are counted. With a
+    checkpoint key, items whose label is in `completed` are saved
+    periodically so an interrupted run resumes where it stopped (and
+    retries everything else).
+    """
+    done = set(bulk_checkpoints.get(checkpoint, [])) if checkpoint else set()
+    counts = defaultdict(int)
+    counts["resumed"] = sum(1 for item in items if item in done)
+    finished = counts["resumed"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        nonlocal finished
+        async with semaphore:
+            try:
+                label = await action(item)
+            except Exception as e:
+                print(f"❌ Bulk action failed for {item}: {e}")
+                label = "failed"
+        counts[label] += 1
+        finished += 1
+        if label in completed:
+            done.add(item)
+
+    async def report():
+        while True:
+            await asyncio.sleep(BULK_PROGRESS_INTERVAL)
+            if checkpoint:
+                bulk_checkpoints[checkpoint] = list(done)
+                await save_bulk_checkpoints()
+            if on_progress:
+                try:
+                    await on_progress(counts, finished, len(items))
+                except discord.HTTPException:
+                    pass
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(*(one(item) for item in items if item not in done))
+    finally:
+        reporter.cancel()
+
+    if checkpoint and bulk_checkpoints.pop(checkpoint, None) is not None:
+        await save_bulk_checkpoints()
+
+    return counts
+
 
 PARTICIPANT_ROLE_ID = 1492471388764639373
 @bot.command()
-async def giveparticipantsrole(ctx):
+async def giveparticipantsrole(ctx, tournament: str = None):
 
     if ctx.author.id not in Admins:
         return await ctx.send("❌ You are not allowed to use this command.")
 
     try:
-        with open("participants.json", "r") as f:
-            data = json.load(f)
-    except Exception as e:
-        return await ctx.send(f"❌ Error loading JSON: {e}")
-
-    participant_ids = data.get("participants", [])
+        participant_ids = await storage.participants(ctx.guild.id, tournament)
+    except StorageError as e:
+        return await ctx.send(f"❌ {e}")
 
     if not participant_ids:
         return await ctx.send("❌ No participants found.")
@@ -1066,58 +4266,62 @@ async def giveparticipantsrole(ctx):
     if not role:
         return await ctx.send("❌ Role not found. Check ROLE ID.")
 
-    success = 0
-    failed = 0
-    not_found = 0
+    # Resolve uncached members over the gateway, 100 IDs per query,
+    # instead of one REST fetch per user
+    missing = [uid for uid in participant_ids if not ctx.guild.get_member(uid)]
+    for i in range(0, len(missing), 100):
+        try:
+            await ctx.guild.query_members(user_ids=missing[i:i + 100], cache=True)
+        except asyncio.TimeoutError:
+            pass
+
+    status = await ctx.send(f"⏳ Giving roles... 0/{len(participant_ids)}")
 
-    for uid in participant_ids:
+    async def give(uid):
         member = ctx.guild.get_member(uid)
-
         if not member:
-            try:
-                member = await ctx.guild.fetch_member(uid)  # 🔥 important fix
-            except:
-                not_found += 1
-                continue
-
+            return "not_found"
+        if member.get_role(role.id):
+            return "skipped"
         try:
             await member.add_roles(role)
-            success += 1
-        except Exception as e:
+            return "success"
+        except discord.HTTPException as e:
             print(f"Error adding role to {uid}: {e}")
-            failed += 1
+            return "failed"
+
+    def summary(counts):
+        return (
+            f"✔️ Success: {counts['success']}\n"
+            f"⏭️ Already had role: {counts['skipped']}\n"
+            f"❌ Failed: {counts['failed']}\n"
+            f"👻 Not Found: {counts['not_found']}"
+        )
 
-    await ctx.send(
-        f"✅ Done!\n"
-        f"✔️ Success: {success}\n"
-        f"❌ Failed: {failed}\n"
-        f"👻 Not Found: {not_found}"
+    async def progress(counts, done, total):
+        await status.edit(content=f"⏳ Giving roles... {done}/{total}\n" + summary(counts))
+
+    counts = await run_bulk(
+        participant_ids,
+        give,
+        on_progress=progress,
+        checkpoint=f"role:{ctx.guild.id}:{role.id}:{tournament or 'active'}"
     )
 
+    resumed = f"\n↩️ Resumed: {counts['resumed']}" if counts["resumed"] else ""
+    await status.edit(content="✅ Done!\n" + summary(counts) + resumed)
+
 @bot.command()
+@is_admin()                           # ✅ Admin check
+@cooldown(1, COOLDOWN, scope="guild")  # ⏳ Once per 2 hours per server
 async def amongus(ctx):
-    global last_used
-
-    # ✅ Admin check
-    if ctx.author.id not in Admins:
-        return await ctx.send("❌ You are not allowed to use this command.")
-
-    # ⏳ Cooldown check
-    now = time.time()
-    if now - last_used < COOLDOWN:
-        remaining = int(COOLDOWN - (now - last_used))
-        minutes = remaining // 60
-        return await ctx.send(f"⏳ Wait {minutes} minutes before using this again.")
-
     # 🔔 Ping role
     role = ctx.guild.get_role(ROLE_ID)
     if not role:
+        refund_cooldown(ctx)
         return await ctx.send("❌ Role not found.")
 
     await ctx.send(f"{role.mention} 🚨 Among Us event starting! Join up!")
 
-    # Update cooldown
-    last_used = now
-
 bot.run(TOKEN)
 